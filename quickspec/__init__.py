@@ -21,6 +21,9 @@ from . import interp
 from . import cosmo
 from . import lens
 from . import gals
+from . import fftlog
+from . import corr
+from . import cov
 
 from . import mps
 from . import cib
@@ -23,10 +23,25 @@ class kern():
         self.cosmo = cosmo
         self.counts = counts
 
-    def w_lxz(self, l, x, z):
+    @property
+    def zrange(self):
+        """Redshift range of the tabulated counts, outside of which the
+        kernel is not defined"""
+
+        return self.counts.zs[0], self.counts.zs[-1]
+
+    separable = True
+
+    def f_lx(self, l, x):
+        return 1.
+
+    def g_xz(self, x, z):
         return 1. / (1. + z) * self.counts.jbar(
             self.nu, z, cosmo=self.cosmo, smax=self.smax)
 
+    def w_lxz(self, l, x, z):
+        return self.g_xz(x, z)
+
 
 class counts():
     def __init__(self, model="mean"):
@@ -52,6 +67,8 @@ class counts():
         self.ds = util.deriv(self.ss)
         self.dz = util.deriv(self.zs)
 
+        self._jbar_tabs = {}
+
         # Note: Assign
         #    143 -> 2100 rather than 2097
         self.nu2ls = {
@@ -91,37 +108,45 @@ class counts():
 
     def jbar(self, nu, z, smax=None, cosmo=None):
         # \bar{j}(nu, z) = (1+z) \int_0^{Scut} dS S [d^2N/dSdz]
+        #
+        # The flux integral is tabulated once per (nu, smax) on the redshift
+        # grid and interpolated with 3-point Lagrange polynomials around the
+        # nearest grid point, for scalar or array z.
 
-        l = self.nu2ls[nu]
-        il = np.where(self.ls == l)[0][0]
-
-        iz_fid = np.argmin((self.zs - z)**2)
-
-        iz_min = max(iz_fid - 1, 0)
-        iz_max = min(iz_min + 3, len(self.zs))
-        iz_min = max(iz_max - 3, 0)
-
-        zs = []
-        rs = []
-        for iz in range(iz_min, iz_max):
-            zs.append(self.zs[iz])
+        key = (nu, smax)
+        if key not in self._jbar_tabs:
+            l = self.nu2ls[nu]
+            il = np.where(self.ls == l)[0][0]
 
             if smax is not None:
                 sidx = np.where(self.ss < smax)[0]
             else:
                 sidx = np.arange(0, len(self.ss))
 
-            if len(sidx) == 0:
-                rs.append(0.0)
-            else:
-                rs.append(
-                    np.sum(
-                        self.ds[sidx] *
-                        self.ss[sidx] *
-                        self.dndsdz[il, iz, :][sidx]))
-
-        return (1. + z) * interp.lagrange(
-            z, np.array(zs), np.array(rs)) * cosmo.H_z(z) / 3.e5
+            self._jbar_tabs[key] = np.dot(
+                self.dndsdz[il][:, sidx], self.ds[sidx] * self.ss[sidx])
+        rs = self._jbar_tabs[key]
+
+        z = np.asarray(z, dtype=float)
+        if np.any(z < self.zs[0]) or np.any(z > self.zs[-1]):
+            raise ValueError(
+                "z out of bounds. zlo, zhi = (%2.2e, %2.2e)" %
+                (self.zs[0], self.zs[-1]))
+
+        iz = np.clip(np.searchsorted(self.zs, z), 1, len(self.zs) - 1)
+        iz_fid = np.where(z - self.zs[iz - 1] <= self.zs[iz] - z, iz - 1, iz)
+        iz_min = np.clip(iz_fid - 1, 0, len(self.zs) - 3)
+
+        zs = [self.zs[iz_min + i] for i in range(0, 3)]
+        ret = 0.
+        for i in range(0, 3):
+            li = 1.
+            for j in range(0, 3):
+                if i != j:
+                    li = li * (z - zs[j]) / (zs[i] - zs[j])
+            ret = ret + li * rs[iz_min + i]
+
+        return (1. + z) * ret * cosmo.H_z(z) / 3.e5
 
 
 class jbar_pep():
@@ -130,12 +130,36 @@ class ssed_kern():
 
 
 
+    @property
+    def separable(self):
+        """Without the scale-dependent bias, the kernel does not depend on
+        l, see mps.kernel_lxz"""
+
+        return self.fnl == 0.
+
+    def f_lx(self, l, x):
+        return 1.
+
+    def g_xz(self, x, z):
+        """The CIB kernel W for fnl = 0
+
+        """
+
+        return self.w_bxz(self.get_b_G(z), x, z)
+
     def w_lxz(self, l, x, z):
         """The actual CIB kernel W
 
         """
 
+        return self.w_bxz(self.get_b_eff(l, x, z), x, z)
+
+    def w_bxz(self, b, x, z):
+        """The CIB kernel W for the bias b
+
+        """
+
         return (
-            1. / (1. + z) * self.get_b_eff(l, x, z) * jbar(
+            1. / (1. + z) * b * jbar(
                 self.nu, z, x,
                 ssed_kwargs=self.ssed_kwargs, **self.jbar_kwargs))
@@ -0,0 +1,111 @@
+"""
+Angular correlation functions from angular power spectra.
+
+The transforms are
+
+    w(theta) = \sum_l (2l+1)/(4 pi) C_l d^l_{m m'}(theta)
+             ~ \int dl l/(2 pi) C_l J_nu(l theta),    nu = |m - m'|,
+
+with (m, m') = (0, 0) for the correlation function of a scalar field,
+(2, 0) for the tangential shear (J_2), and (2, 2) and (2, -2) for the
+shear correlation functions xi_+ (J_0) and xi_- (J_4).
+
+"""
+
+import numpy as np
+
+from . import fftlog, interp
+
+
+def cl_interp(ls, cls, lv):
+    """
+    Returns the power spectra cls (with multipoles ls along the last axis)
+    interpolated to the multipoles lv with interp.loglog, and set to zero
+    outside of [ls[0], ls[-1]].
+
+    """
+
+    ls = np.asarray(ls, dtype=float)
+    lv = np.asarray(lv, dtype=float)
+    cls = np.asarray(cls, dtype=float)
+
+    inside = (lv >= ls[0]) & (lv <= ls[-1])
+    ret = np.zeros(cls.shape[:-1] + lv.shape)
+    ret[..., inside] = interp.loglog(ls, cls)(lv[inside])
+
+    return ret
+
+
+def w_theta_flat(ls, cls, nu=0, n=4096, pad=100., q=1.):
+    """
+    Returns (theta, w) with the flat-sky transform
+
+        w(theta) = \int dl l/(2 pi) C_l J_nu(l theta)
+
+    of the power spectra cls at multipoles ls (along the last axis) on n
+    log-spaced angles theta = 1/l (in radians), computed by FFTLog. C_l is
+    interpolated with cl_interp, held constant below ls[0] (so that
+    l^2 C_l vanishes smoothly instead of jumping, which would ring) and
+    vanishes above ls[-1]. The log-l grid extends beyond [ls[0], ls[-1]]
+    by a factor pad on either side so that the transform is not
+    periodically wrapped.
+
+    q must lie within (-nu, 3/2).
+
+    """
+
+    ls = np.asarray(ls, dtype=float)
+    lv = np.logspace(
+        np.log10(ls[0] / pad), np.log10(ls[-1] * pad), n)
+
+    f = lv**2 / (2. * np.pi) * cl_interp(ls, cls, np.maximum(lv, ls[0]))
+    return fftlog.fftlog(lv, f, fftlog.mellin_jnu(nu), q=q)
+
+
+def w_theta_exact(ls, cls, theta, m=0, mp=0):
+    """
+    Returns the full-sky transform
+
+        w(theta) = \sum_l (2l+1)/(4 pi) C_l d^l_{m mp}(theta)
+
+    of the power spectra cls at multipoles ls (along the last axis) at the
+    angles theta (in radians), summing over every integer multipole in
+    [ls[0], ls[-1]] with C_l from cl_interp. The Wigner d-functions are
+    built by their three-term recursion in l, for m = 0 or 2 and
+    |mp| <= m.
+
+    """
+
+    assert((m, mp) in [(0, 0), (2, 0), (2, 2), (2, -2)])
+
+    lmax = int(np.floor(ls[-1]))
+    lv = np.arange(0, lmax + 1)
+    coeffs = (2. * lv + 1.) / (4. * np.pi) * cl_interp(ls, cls, lv)
+
+    theta = np.asarray(theta, dtype=float)
+    c = np.cos(theta)
+
+    # d^l_{m mp} for l = m - 1 and l = m
+    dm = np.zeros_like(c)
+    if m == 0:
+        d = np.ones_like(c)
+    elif mp == 0:
+        d = np.sqrt(3. / 8.) * (1. - c**2)
+    elif mp == 2:
+        d = (0.5 * (1. + c))**2
+    else:
+        d = (0.5 * (1. - c))**2
+
+    ret = coeffs[..., m, None] * d
+    for l in range(m, lmax):
+        if l == 0:
+            dp = c
+        else:
+            dp = (
+                (2. * l + 1.) * (l * (l + 1.) * c - m * mp) * d -
+                (l + 1.) * np.sqrt((l**2 - m**2) * (l**2 - mp**2)) * dm) / (
+                l * np.sqrt(((l + 1.)**2 - m**2) * ((l + 1.)**2 - mp**2)))
+        dm, d = d, dp
+        ret += coeffs[..., l + 1, None] * d
+
+    return ret
@@ -1,9 +1,18 @@
 import warnings
 
 import numpy as np
-from scipy import interpolate, integrate
+from scipy import interpolate
 
-from . import units
+from . import interp, units, util
+
+# Redshift grid on which the comoving distance is tabulated.
+zvec_default = np.concatenate([
+    np.linspace(0., 20., 500, endpoint=False),
+    np.linspace(20., 200., 200, endpoint=False),
+    np.linspace(200., 1500., 100)])
+
+# Grid in ln(a) on which the growth factor and the age are tabulated.
+lnavec_default = np.linspace(np.log(1.e-10), 0., 3000)
 
 
 class LCDM():
@@ -12,7 +21,13 @@ class LCDM():
 
     """
 
-    def __init__(self, omr=0.0, omb=0.05, omc=0.25, oml=0.7, H0=70.):
+    # Domain checks on the inputs of x_z, z_x, G_z etc., which can be
+    # disabled per object or temporarily with util.unchecked.
+    check_bounds = True
+
+    def __init__(
+            self, omr=0.0, omb=0.05, omc=0.25, oml=0.7, H0=70., tol=1.e-10,
+            lazy=False, check_bounds=True, cache=False):
         """
         Initialize the flat lcdm cosmology. parameters:
                * omr = omega radiation.
@@ -20,14 +35,28 @@ class LCDM():
                * omc = omega cold dark matter.
                * oml = omega lambda.
                * H0  = hubble constant (km/s/Mpc).
+               * tol = relative tolerance of the tabulated distances.
+               * lazy = if True, the distance table is only computed on
+                        first access of zvec, xvec or the splines.
+               * check_bounds = if False, inputs are trusted to lie within
+                                the tabulated ranges.
+               * cache = if True, the distance, growth and age tables are
+                         stored on disk (see util.cached) and memory-mapped
+                         by later instances with the same parameters.
 
        """
         # Initiate properties
+        self._zvec = None
+        self._xvec = None
         self._spl_x_z = None
         self._spl_z_x = None
+        self._spl_lng_lna = None
+        self._spl_f_lna = None
+        self._spl_lnt_lna = None
+        self._spl_lna_lnt = None
 
-        # check for flatness
-        if not ((omb + omc + omr + oml) == 1.0):
+        # check for flatness, up to rounding of the summed densities
+        if not (abs(omb + omc + omr + oml - 1.0) < 1.e-12):
             raise ValueError('Sum of densities must be equal to 1.')
 
         # Standard cosmological parameters
@@ -40,28 +69,80 @@ class LCDM():
 
         self.omm = omb + omc  # total matter density
 
-        # Redshift vector
-        self.zvec = np.concatenate([
-            np.linspace(0., 20., 500, endpoint=False),
-            np.linspace(20., 200., 200, endpoint=False),
-            np.linspace(200., 1500., 100)])
+        self.tol = tol
+        self.check_bounds = check_bounds
+        self.cache = cache
+
+        # ln(a) vector for the growth factor and age tables
+        self.lnavec = lnavec_default.copy()
 
-        # Vector of comoving distance
-        self.xvec = np.array([
-            integrate.quad(
-                lambda z: (units.c * 1.e-3) / self.H_z(z), 0., zmax)[0]
-            for zmax in self.zvec])
+        if not lazy:
+            self.xvec
 
-        self.zmin = np.min(self.zvec)
-        self.zmax = np.max(self.zvec)
-        self.xmin = np.min(self.xvec)
-        self.xmax = np.max(self.xvec)
+    @property
+    def zvec(self):
+        if self._zvec is None:
+            # Redshift vector
+            self._zvec = zvec_default.copy()
+
+            self._zmin = np.min(self._zvec)
+            self._zmax = np.max(self._zvec)
+
+        return self._zvec
+
+    @property
+    def xvec(self):
+        if self._xvec is None:
+            # Vector of comoving distance, integrated cumulatively over zvec
+            self._xvec = self.tabulate(
+                'lcdm_xvec', self.zvec, lambda: util.cumquad(
+                    lambda z: (units.c * 1.e-3) / self.H_z(z),
+                    self.zvec, tol=self.tol))
+
+            self._xmin = np.min(self._xvec)
+            self._xmax = np.max(self._xvec)
+
+        return self._xvec
+
+    def tabulate(self, name, grid, build):
+        """
+        Returns the table build() of quantity name on grid. If self.cache is
+        True, the table is kept in the on-disk cache, keyed by the
+        cosmological parameters, the tolerance and the grid.
+
+        """
+
+        if not self.cache:
+            return build()
+
+        key = util.cache_key(
+            self.omr, self.omb, self.omc, self.oml, self.H0, self.tol, grid)
+        return util.cached(name, key, build)
+
+    @property
+    def zmin(self):
+        self.zvec
+        return self._zmin
+
+    @property
+    def zmax(self):
+        self.zvec
+        return self._zmax
+
+    @property
+    def xmin(self):
+        self.xvec
+        return self._xmin
+
+    @property
+    def xmax(self):
+        self.xvec
+        return self._xmax
 
     @property
     def spl_x_z(self):
         if self._spl_x_z is None:
-            self._spl_x_z = interpolate.UnivariateSpline(
-                self.zvec, self.xvec, k=3, s=0)
+            self._spl_x_z = interp.spline1d(self.zvec, self.xvec)
 
         return self._spl_x_z
 
@@ -73,26 +154,90 @@ class LCDM():
 
         return self._spl_z_x
 
+    @property
+    def spl_lng_lna(self):
+        if self._spl_lng_lna is None:
+            # Dodelson Eq. 7.77, G(a) = 5/2 omm H(a)/H0 \int_0^a da' /
+            # (a' H(a')/H0)^3, integrated cumulatively in u = sqrt(a) so
+            # that the integrand is smooth down to a = 0.
+            def build():
+                uvec = np.concatenate([[0.], np.exp(0.5 * self.lnavec)])
+                integral = util.cumquad(
+                    lambda u: 2. * u * (self.H0 / (u**2 * self.H_a(u**2)))**3,
+                    uvec, tol=self.tol)[1:]
+                avec = np.exp(self.lnavec)
+                return np.log(
+                    2.5 * self.omm * self.H_a(avec) / self.H0 * integral)
+
+            self.lngvec = self.tabulate('lcdm_lngvec', self.lnavec, build)
+
+            self._spl_lng_lna = interp.spline1d(self.lnavec, self.lngvec)
+
+        return self._spl_lng_lna
+
+    @property
+    def spl_lnt_lna(self):
+        if self._spl_lnt_lna is None:
+            # da/dt / a = H_a
+            # da / H_a / a = dt
+            # /int_{a=0}^{a(z)} da / H_a / a = t
+            # H0 = km/s/Mpc * 1Mpc/1e6pc * 1e3m/km * 3.08e16pc / m
+            # 1Mpc = 3.25e6 ly
+            # Integrated cumulatively in u = sqrt(a), da / a = 2 du / u.
+            def build():
+                uvec = np.concatenate([[0.], np.exp(0.5 * self.lnavec)])
+                age = util.cumquad(
+                    lambda u: 2. / (self.H_a(u**2) / 3.08e19) / u /
+                    (365 * 24. * 60. * 60.),
+                    uvec, tol=self.tol)[1:]
+                return np.log(age / 1.e9)
+
+            self.lntvec = self.tabulate('lcdm_lntvec', self.lnavec, build)
+
+            self._spl_lnt_lna = interp.spline1d(self.lnavec, self.lntvec)
+
+        return self._spl_lnt_lna
+
+    @property
+    def spl_lna_lnt(self):
+        if self._spl_lna_lnt is None:
+            self._spl_lna_lnt = interpolate.UnivariateSpline(
+                self.spl_lnt_lna(self.lnavec), self.lnavec, k=3, s=0)
+
+        return self._spl_lna_lnt
+
+    @property
+    def spl_f_lna(self):
+        if self._spl_f_lna is None:
+            self._spl_f_lna = self.spl_lng_lna.derivative()
+
+        return self._spl_f_lna
+
     def t_z(self, z):
         """
         Returns the age of the Universe (in Gyr) at redshift z.
 
         """
 
-        # da/dt / a = H_a
-        # da / H_a / a = dt
-        # /int_{a=0}^{a(z)} da / H_a / a = t
-        # H0 = km/s/Mpc * 1Mpc/1e6pc * 1e3m/km * 3.08e16pc / m
-        # 1Mpc = 3.25e6 ly
-        def get_age(a):
-            age = 1. / (self.H_a(a) / 3.08e19) / a / (365 * 24. * 60. * 60.)
-            return age
+        lna = -np.log(1. + np.asarray(z, dtype=float))
+        if self.check_bounds:
+            assert(np.all(lna >= self.lnavec[0]))
 
-        lower = 1.e-10
-        upper = 1. / (1. + z)
-        t_z = integrate.quad(get_age, lower, upper)[0] / 1.e9
+        return np.exp(self.spl_lnt_lna(lna))
+
+    def z_t(self, t):
+        """
+        Returns the redshift z at which the Universe has age t (in Gyr).
+
+        """
 
-        return t_z
+        lnt = np.log(t)
+        if self.check_bounds:
+            self.spl_lna_lnt
+            assert(np.all(lnt >= self.lntvec[0]))
+            assert(np.all(lnt <= self.lntvec[-1]))
+
+        return np.exp(-self.spl_lna_lnt(lnt)) - 1.
 
     def x_z(self, z):
         """
@@ -100,6 +245,9 @@ class LCDM():
 
         """
 
+        if not self.check_bounds:
+            return self.spl_x_z(z)
+
         assert(np.all(z >= self.zmin))
         assert(np.all(z <= self.zmax))
 
@@ -118,6 +266,9 @@ class LCDM():
 
         """
 
+        if not self.check_bounds:
+            return self.spl_z_x(x)
+
         assert(np.all(x >= self.xmin))
         assert(np.all(x <= self.xmax))
 
@@ -161,15 +312,24 @@ class LCDM():
         Returns the growth factor G(z) at redshift z (Eq. 7.77 of Dodelson).
 
         """
-        if np.isscalar(z) or (np.size(z) == 1):
-            integral = integrate.quad(
-                lambda a: (self.H0 / (a * self.H_a(a)))**3,
-                0,
-                1. / (1. + z))[0]
-            Gz = 2.5 * self.omm * self.H_a(1. / (1. + z)) / self.H0 * integral
-            return Gz
-        else:
-            return np.array([self.G_z(tz) for tz in z])
+
+        lna = -np.log(1. + np.asarray(z, dtype=float))
+        if self.check_bounds:
+            assert(np.all(lna >= self.lnavec[0]))
+
+        return np.exp(self.spl_lng_lna(lna))
+
+    def f_z(self, z):
+        """
+        Returns the linear growth rate f(z) = dlnG/dlna at redshift z.
+
+        """
+
+        lna = -np.log(1. + np.asarray(z, dtype=float))
+        if self.check_bounds:
+            assert(np.all(lna >= self.lnavec[0]))
+
+        return self.spl_f_lna(lna)
 
     def G_x(self, x):
         """
@@ -210,11 +370,166 @@ class LCDM():
 
 
 class Planck15(LCDM):
-    def __init__(self, omr=0.0, omb=0.0486, omc=0.2589, oml=0.6925, H0=67.7):
+    def __init__(
+            self, omr=0.0, omb=0.0486, omc=0.2589, oml=0.6925, H0=67.7,
+            tol=1.e-10, lazy=False, check_bounds=True, cache=False):
 
         super(Planck15, self).__init__(
             omr=omr,
             omb=omb,
             omc=omc,
             oml=oml,
-            H0=H0)
+            H0=H0,
+            tol=tol,
+            lazy=lazy,
+            check_bounds=check_bounds,
+            cache=cache)
+
+
+class LCDMBatch():
+    """
+    Class to encapsulate a set of flat lcdm cosmologies, evaluated together.
+
+    The parameters are stored as columns of shape (n_cosmo, 1), so that
+    quantities at a scalar or 1D array of redshifts z are returned with
+    shape (n_cosmo, n_z).
+
+    """
+
+    def __init__(self, omr=0.0, omb=0.05, omc=0.25, oml=0.7, H0=70.,
+                 tol=1.e-10):
+        """
+        Initialize the set of flat lcdm cosmologies. parameters are scalars
+        or 1D arrays, broadcast against each other:
+               * omr = omega radiation.
+               * omb = omega baryon.
+               * omc = omega cold dark matter.
+               * oml = omega lambda.
+               * H0  = hubble constant (km/s/Mpc).
+               * tol = relative tolerance of the distance and growth
+                       integrals.
+
+       """
+
+        omr, omb, omc, oml, H0 = [
+            np.atleast_1d(np.asarray(p, dtype=float))
+            for p in np.broadcast_arrays(omr, omb, omc, oml, H0)]
+        assert(omb.ndim == 1)
+
+        # check for flatness, up to rounding of the summed densities
+        if not np.all(np.abs(omb + omc + omr + oml - 1.0) < 1.e-12):
+            raise ValueError('Sum of densities must be equal to 1.')
+
+        # Standard cosmological parameters
+        self.omr = omr[:, None]  # radiation
+        self.omb = omb[:, None]  # baryons
+        self.omc = omc[:, None]  # CDM
+        self.oml = oml[:, None]  # dark energy, Lambda
+        self.H0 = H0[:, None]  # Hubble constant
+        self.h = self.H0 / 100.  # h
+
+        self.omm = self.omb + self.omc  # total matter density
+
+        self.tol = tol
+
+    def __len__(self):
+        return len(self.H0)
+
+    def __getitem__(self, i):
+        """
+        Returns the i-th cosmology of the set as a (lazy) LCDM object.
+
+        """
+
+        return LCDM(
+            omr=self.omr[i, 0], omb=self.omb[i, 0], omc=self.omc[i, 0],
+            oml=self.oml[i, 0], H0=self.H0[i, 0], tol=self.tol, lazy=True)
+
+    def H_a(self, a):
+        """
+        Returns the Hubble factor H(a) at scale factor a=1/(1+z), with shape
+        (n_cosmo, n_a).
+
+        """
+
+        return self.H0 * np.sqrt(
+            self.oml + self.omm * a**(-3) + self.omr * a**(-4))
+
+    def H_z(self, z):
+        """
+        Returns the Hubble factor H(z) at redshift z, with shape
+        (n_cosmo, n_z).
+
+        """
+
+        return self.H_a(1. / (1. + np.asarray(z, dtype=float)))
+
+    def x_z(self, z):
+        """
+        Returns the comoving distance (in Mpc) to redshift z, with shape
+        (n_cosmo, n_z).
+
+        """
+
+        z = np.asarray(z, dtype=float)
+        assert(np.all(z >= 0.))
+
+        # Integrate c/H(z) cumulatively over the requested redshifts, merged
+        # with the default grid so that every interval is short.
+        zvec = np.union1d(zvec_default, z.flatten())
+        xvec = util.cumquad(
+            lambda tz: (units.c * 1.e-3) / self.H_z(tz), zvec, tol=self.tol)
+
+        ret = xvec[:, np.searchsorted(zvec, z.flatten())]
+        return ret.reshape((len(self),) + np.shape(z))
+
+    def growth_integral_a(self, a):
+        """
+        Returns the integral \\int_0^a da' / (a' H(a')/H0)^3, with shape
+        (n_cosmo, n_a).
+
+        """
+
+        a = np.asarray(a, dtype=float)
+        assert(np.all(a > 0.))
+
+        # Integrate cumulatively in u = sqrt(a), over the requested scale
+        # factors merged with a subset of the default grid.
+        uvec = np.union1d(
+            np.concatenate([[0.], np.exp(0.5 * lnavec_default[::10])]),
+            np.sqrt(a.flatten()))
+        integral = util.cumquad(
+            lambda u: 2. * u * (self.H0 / (u**2 * self.H_a(u**2)))**3,
+            uvec, tol=self.tol)
+
+        ret = integral[:, np.searchsorted(uvec, np.sqrt(a.flatten()))]
+        return ret.reshape((len(self),) + np.shape(a))
+
+    def G_z(self, z):
+        """
+        Returns the growth factor G(z) at redshift z (Eq. 7.77 of Dodelson),
+        with shape (n_cosmo, n_z).
+
+        """
+
+        a = 1. / (1. + np.asarray(z, dtype=float))
+
+        return (
+            2.5 * self.omm * self.H_a(a) / self.H0 *
+            self.growth_integral_a(a))
+
+    def f_z(self, z):
+        """
+        Returns the linear growth rate f(z) = dlnG/dlna at redshift z, with
+        shape (n_cosmo, n_z).
+
+        """
+
+        a = 1. / (1. + np.asarray(z, dtype=float))
+        E2 = (self.H_a(a) / self.H0)**2
+
+        dlnE_dlna = -(3. * self.omm * a**(-3) + 4. * self.omr * a**(-4)) / (
+            2. * E2)
+        dlnI_dlna = a**(-2) * E2**(-1.5) / self.growth_integral_a(a)
+
+        return dlnE_dlna + dlnI_dlna
@@ -0,0 +1,106 @@
+"""
+Gaussian covariances of angular power spectra.
+
+For N tracers with signal spectra C^{ab}_l and noise spectra N^{ab}_l
+observed over a fraction f_sky of the sky, the Knox formula gives
+
+    Cov[C^{ab}_l, C^{cd}_l'] = delta_{l l'} / ((2l+1) f_sky dl) *
+        (Ct^{ac}_l Ct^{bd}_l + Ct^{ad}_l Ct^{bc}_l),
+
+with Ct = C + N and dl the width of the multipole bin. The data vector
+holds the N(N+1)/2 unique spectra (a <= b) in the order of pairs(N).
+
+"""
+
+import numpy as np
+
+
+def pairs(n):
+    """
+    Returns the index arrays (a, b) of the n(n+1)/2 unique pairs a <= b of
+    n tracers, in the order used for the data vector.
+
+    """
+    return np.triu_indices(n)
+
+
+def knox(ls, cls, nls=None, fsky=1., dl=1., packed=False):
+    """
+    Returns the Gaussian covariance of the unique spectra between N
+    tracers. The covariance is diagonal in l, so it is returned per
+    multipole: as an array of shape (n_p, n_p, len(ls)) over the n_p =
+    N(N+1)/2 pairs of pairs(N), or with packed=True as an array of shape
+    (n_p(n_p+1)/2, len(ls)) holding only its upper triangle in the order
+    of pairs(n_p), see unpack.
+
+    Input
+    -----
+    ls:
+        Multipoles (or bin centers).
+    cls:
+        Signal spectra, with shape (N, N, len(ls)).
+    nls:
+        Noise spectra, with shape (N, N, len(ls)), or (N, len(ls)) for
+        noise which is uncorrelated between tracers. Defaults to zero.
+    fsky:
+        Observed sky fraction.
+    dl:
+        Width of the multipole bins (scalar or one per multipole).
+
+    """
+    ls = np.asarray(ls, dtype=float)
+    ct = np.array(cls, dtype=float)
+
+    n = ct.shape[0]
+    assert(ct.shape == (n, n, len(ls)))
+
+    if nls is not None:
+        nls = np.asarray(nls, dtype=float)
+        if nls.ndim == 2:
+            ct[np.arange(n), np.arange(n)] += nls
+        else:
+            ct += nls
+
+    a, b = pairs(n)
+    if packed:
+        p, q = pairs(len(a))
+        a, b, c, d = a[p], b[p], a[q], b[q]
+    else:
+        a, b, c, d = a[:, None], b[:, None], a[None, :], b[None, :]
+
+    return (ct[a, c] * ct[b, d] + ct[a, d] * ct[b, c]) / (
+        (2. * ls + 1.) * fsky * dl)
+
+
+def unpack(cov):
+    """
+    Returns the (n_p, n_p, n_l) covariance from the packed upper triangle
+    returned by knox(..., packed=True).
+
+    """
+    n_pp = cov.shape[0]
+    n_p = int(np.sqrt(8 * n_pp + 1) - 1) // 2
+    assert(n_p * (n_p + 1) // 2 == n_pp)
+
+    p, q = pairs(n_p)
+    ret = np.empty((n_p, n_p) + cov.shape[1:])
+    ret[p, q] = cov
+    ret[q, p] = cov
+
+    return ret
+
+
+def block(cov):
+    """
+    Returns the dense (n_p * n_l, n_p * n_l) covariance matrix of the data
+    vector ordered pair-major (all multipoles of the first pair, then the
+    second, ...) from the (n_p, n_p, n_l) per-multipole covariance.
+
+    """
+    n_p, _, n_l = cov.shape
+
+    ret = np.zeros((n_p, n_l, n_p, n_l))
+    il = np.arange(n_l)
+    ret[:, il, :, il] = np.moveaxis(cov, -1, 0)
+
+    return ret.reshape(n_p * n_l, n_p * n_l)
@@ -0,0 +1,128 @@
+import numpy as np
+from scipy import special
+
+
+def mellin_jl(l):
+    """
+    Returns the Mellin transform M(s) = \int dt t^{s-1} j_l(t) of the
+    spherical Bessel function j_l, valid for -l < Re(s) < 2.
+
+    """
+    def mellin(s):
+        return np.sqrt(np.pi) * np.exp(
+            (s - 2.) * np.log(2.) +
+            special.loggamma(0.5 * (l + s)) -
+            special.loggamma(0.5 * (3. + l - s)))
+    return mellin
+
+
+def mellin_jnu(nu):
+    """
+    Returns the Mellin transform M(s) = \int dt t^{s-1} J_nu(t) of the
+    Bessel function J_nu, valid for -nu < Re(s) < 3/2.
+
+    """
+    def mellin(s):
+        return np.exp(
+            (s - 1.) * np.log(2.) +
+            special.loggamma(0.5 * (nu + s)) -
+            special.loggamma(0.5 * (2. + nu - s)))
+    return mellin
+
+
+def _gamma_cos(a, b):
+    """
+    Returns Gamma(a) * cos(pi*a/2) * b^{-a}, evaluated through log-gamma so
+    that it stays finite for large imaginary parts of a.
+
+    """
+    lg = special.loggamma(a) - a * np.log(b)
+    return 0.5 * (np.exp(lg + 0.5j * np.pi * a) +
+                  np.exp(lg - 0.5j * np.pi * a))
+
+
+def _gamma_sin(a, b):
+    """
+    Returns Gamma(a) * sin(pi*a/2) * b^{-a}, see _gamma_cos.
+
+    """
+    lg = special.loggamma(a) - a * np.log(b)
+    return -0.5j * (np.exp(lg + 0.5j * np.pi * a) -
+                    np.exp(lg - 0.5j * np.pi * a))
+
+
+def mellin_tophat2(s):
+    """
+    Returns the Mellin transform M(s) = \int dt t^{s-1} W(t)^2 of the
+    squared Fourier-space tophat window W(t) = 3 (sin t - t cos t) / t^3,
+    valid for 0 < Re(s) < 4. The poles of the individual terms at integer
+    s cancel, but should be avoided numerically.
+
+    """
+    return 9. * (
+        -0.5 * _gamma_cos(s - 6., 2.) -
+        _gamma_sin(s - 5., 2.) +
+        0.5 * _gamma_cos(s - 4., 2.))
+
+
+def mellin_dtophat2(s):
+    """
+    Returns the Mellin transform of t d/dt W(t)^2, which is -s M(s) for the
+    Mellin transform M(s) of W(t)^2 in mellin_tophat2.
+
+    """
+    return -s * mellin_tophat2(s)
+
+
+def fftlog(k, f, mellin, q=0., kr=1.):
+    """
+    Returns (r, F) for the integral transform
+
+        F(r) = \int dk/k f(k) K(k r)
+
+    of samples f on the log-spaced grid k, where the kernel K enters only
+    through its Mellin transform M(s) = \int dt t^{s-1} K(t). The output grid
+    r has the same length and spacing as k, with k[i] * r[-1-i] = kr.
+
+    The samples are biased by k^{-q} before the discrete Fourier transform,
+    and q must lie inside the strip where M(s) is defined. f may carry
+    leading dimensions; the transform acts along the last axis.
+
+    Reference:
+        Hamilton (2000, arxiv:astro-ph/9905191)
+
+    Input
+    -----
+    k:
+        Log-spaced, increasing sample points.
+    f:
+        Samples of the function, with shape (..., len(k)).
+    mellin:
+        Callable returning M(s) for an array of complex s.
+    q:
+        Power-law bias.
+    kr:
+        Product of the matching input and output sample points.
+
+    """
+    k = np.asarray(k, dtype=float)
+    f = np.asarray(f, dtype=float)
+
+    n = len(k)
+    dlnk = np.log(k[-1] / k[0]) / (n - 1)
+    assert(np.allclose(np.diff(np.log(k)), dlnk))
+
+    r = kr / k[::-1]
+
+    cm = np.fft.rfft(f * (k / k[0])**(-q), axis=-1) / n
+    eta = 2. * np.pi / (n * dlnk) * np.arange(0, cm.shape[-1])
+    s = q + 1.j * eta
+
+    # \sum_m c_m (k[0] r[j])^{-s_m} M(s_m), with the sum over negative m
+    # given by the complex conjugate since f and K are real.
+    um = cm * (k[0] * r[0])**(-1.j * eta) * mellin(s)
+    if n % 2 == 0:
+        um[..., -1] = um[..., -1].real
+    ret = np.fft.irfft(np.conj(um), n, axis=-1) * n
+
+    return r, ret * (k[0] * r)**(-q)
@@ -2,7 +2,7 @@ from . import units
 
 
 class kern():
-    def __init__(self, cosmo, dndz, b=1.):
+    def __init__(self, cosmo, dndz, b=1., zrange=None):
         """
         Redshift kernel for a galaxy survey.
 
@@ -14,14 +14,26 @@ class kern():
             Function dndz(z) which returns # galaxies per sr per z.
         b: float
             Linear bias parameter.
+        zrange: tuple
+            Optional (zmin, zmax) outside of which dndz vanishes, used to
+            narrow the Limber integrals with support=True.
 
         """
 
         self.cosmo = cosmo
         self.dndz = dndz
         self.b = b
+        self.zrange = zrange
 
         self.cfac = 3. * cosmo.omm * (cosmo.H0 * 1.e3 / units.c)**2
 
-    def w_lxz(self, l, x, z):
+    separable = True
+
+    def f_lx(self, l, x):
+        return 1.
+
+    def g_xz(self, x, z):
         return self.b * (self.cosmo.H_z(z) * 1.e3 / units.c) * self.dndz(z)
+
+    def w_lxz(self, l, x, z):
+        return self.g_xz(x, z)
@@ -1,10 +1,11 @@
 import numpy as np
-from scipy import import integrate, interpolate
+from scipy import integrate
 
-from .. import quickspec as qs
+from .. import interp, util
+from ..mps import mps
 
 
-class halo_model(qs.mps.mps):
+class halo_model(mps.mps):
     """
     Base class for encapsulating a halo model for large scale structure
     See Cooray and Sheth (2002, http://arxiv.org/abs/astro-ph/0206508).
@@ -74,51 +75,60 @@ class halo_model_cache(halo_model):
         self.vec_k = np.logspace(
             np.log10(kmin),
             np.log10(kmax),
-            (np.log10(kmax) - np.log10(kmin)) * npts)
+            int((np.log10(kmax) - np.log10(kmin)) * npts))
         self.vec_lnk = np.log(self.vec_k)
 
         self.mat_lnp_kz_1h = np.zeros((len(self.vec_k), len(self.vec_z)))
         self.mat_lnp_kz_2h = np.zeros((len(self.vec_k), len(self.vec_z)))
 
-        for ik, k in qs.util.enumerate_progress(
+        for ik, k in util.enumerate_progress(
                 self.vec_k, label="halo::model_cache::init"):
             for iz, z in enumerate(self.vec_z):
                 self.mat_lnp_kz_1h[ik, iz] = np.log(mod.p_kz_1h(k, z))
                 self.mat_lnp_kz_2h[ik, iz] = (
                     np.log(mod.p_kz_2h(k, z) / mod.p_lin.p_kz(k, z)))
 
-        self.spl_lnp_kz_1h = interpolate.RectBivariateSpline(
-            self.vec_lnk,
-            self.vec_z,
-            self.mat_lnp_kz_1h, kx=3, ky=3, s=0)
+        self.spl_lnp_kz_1h = interp.spline2d(
+            self.vec_lnk, self.vec_z, self.mat_lnp_kz_1h)
 
-        self.spl_lnp_kz_2h = interpolate.RectBivariateSpline(
-            self.vec_lnk,
-            self.vec_z,
-            self.mat_lnp_kz_2h, kx=3, ky=3, s=0)
+        self.spl_lnp_kz_2h = interp.spline2d(
+            self.vec_lnk, self.vec_z, self.mat_lnp_kz_2h)
 
         self.kmin = np.min(self.vec_k)
         self.kmax = np.max(self.vec_k)
         self.zmin = np.min(self.vec_z)
         self.zmax = np.max(self.vec_z)
 
+    def checked_objects(self):
+        return [self] + self.model.p_lin.checked_objects()
+
     def p_kz_1h(self, k, z):
-        assert(np.all(k >= self.kmin))
-        assert(np.all(k <= self.kmax))
-        assert(np.all(z >= self.zmin))
-        assert(np.all(z <= self.zmax))
+        self.check_kz(k, z)
 
         return np.exp(self.spl_lnp_kz_1h.ev(np.log(k), z))
 
     def p_kz_2h(self, k, z):
-        assert(np.all(k >= self.kmin))
-        assert(np.all(k <= self.kmax))
-        assert(np.all(z >= self.zmin))
-        assert(np.all(z <= self.zmax))
+        self.check_kz(k, z)
 
         return np.exp(
             self.spl_lnp_kz_2h.ev(np.log(k), z)) * self.model.p_lin.p_kz(k, z)
 
+    def p_kz_grid(self, k, z):
+        """
+        Returns the sum of the 1h and 2h terms on the (len(k), len(z))
+        grid of wavenumbers k and redshifts z.
+
+        """
+
+        k, z = util.grid(k, z)
+        self.check_kz(k, z)
+
+        lnk = np.log(k)
+        return (
+            np.exp(interp.ev_grid(self.spl_lnp_kz_1h, lnk, z)) +
+            np.exp(interp.ev_grid(self.spl_lnp_kz_2h, lnk, z)) *
+            self.model.p_lin.p_kz_grid(k, z))
+
 
 model = halo_model
 model_cache = halo_model_cache
@@ -1,4 +1,6 @@
 import numpy as np
+from scipy import interpolate
+from scipy.linalg import lapack
 
 
 def lagrange(x, xv, yv, n=3, check_bounds=True):
@@ -58,3 +60,288 @@ def linterp2d(x, y, xv, yv, f, check_bounds=True):
         f[ix + 1, iy + 1] * (x - xv[ix]) * (y - yv[iy])) / den
 
     return ret
+
+
+class bspline_basis():
+    """
+    Interpolating B-spline basis of degree k on the fixed grid xv, with the
+    not-a-knot end conditions of scipy's UnivariateSpline(..., s=0).
+
+    The banded collocation matrix is LU-factorized once, so that the
+    coefficients for new tabulated values on the same grid only cost a
+    banded back-substitution.
+
+    """
+
+    def __init__(self, xv, k=3):
+        xv = np.asarray(xv, dtype=float)
+        assert(k % 2 == 1)
+        assert(len(xv) > k)
+        assert(np.all(np.diff(xv) > 0.))
+
+        self.xv = xv
+        self.k = k
+        self.t = np.concatenate([
+            [xv[0]] * (k + 1),
+            xv[(k + 1) // 2:-(k + 1) // 2],
+            [xv[-1]] * (k + 1)])
+
+        # Banded LU factorization of the collocation matrix
+        mat = interpolate.BSpline.design_matrix(xv, self.t, k).tocoo()
+        self.kl = max(np.max(mat.row - mat.col), 0)
+        self.ku = max(np.max(mat.col - mat.row), 0)
+
+        ab = np.zeros((2 * self.kl + self.ku + 1, len(xv)))
+        ab[self.kl + self.ku + mat.row - mat.col, mat.col] = mat.data
+        self.lu, self.piv, info = lapack.dgbtrf(ab, self.kl, self.ku)
+        assert(info == 0)
+
+    def coeffs(self, yv):
+        """
+        Returns the spline coefficients interpolating the values yv along
+        the first axis.
+
+        """
+
+        yv = np.asarray(yv, dtype=float)
+        c, info = lapack.dgbtrs(
+            self.lu, self.kl, self.ku,
+            yv.reshape(len(self.xv), -1), self.piv)
+        assert(info == 0)
+
+        return c.reshape(yv.shape)
+
+    def coeffs_adjoint(self, cv):
+        """
+        Returns A^{-T} cv along the first axis, for the collocation matrix
+        A. Contracting a linear functional of the spline coefficients with
+        this gives the same functional of the tabulated values.
+
+        """
+
+        cv = np.asarray(cv, dtype=float)
+        y, info = lapack.dgbtrs(
+            self.lu, self.kl, self.ku,
+            cv.reshape(len(self.xv), -1), self.piv, trans=1)
+        assert(info == 0)
+
+        return y.reshape(cv.shape)
+
+    def design(self, x):
+        """
+        Returns the sparse (len(x), len(xv)) matrix of the basis functions
+        evaluated at x, which must lie inside the grid.
+
+        """
+
+        return interpolate.BSpline.design_matrix(
+            np.asarray(x, dtype=float), self.t, self.k)
+
+    def local(self, x):
+        """
+        Returns (i, b) for the 1D array x, clamped to the grid: the index i
+        of the first of the k + 1 basis functions which do not vanish at
+        each point, and their (len(x), k + 1) values b, by the Cox-de Boor
+        recursion.
+
+        """
+
+        t, k = self.t, self.k
+        x = np.clip(x, self.xv[0], self.xv[-1])
+        j = np.clip(
+            np.searchsorted(t, x, side='right') - 1, k, len(t) - k - 2)
+
+        b = np.zeros((len(x), k + 1))
+        b[:, 0] = 1.
+        left = np.zeros((len(x), k))
+        right = np.zeros((len(x), k))
+        for d in range(0, k):
+            left[:, d] = x - t[j - d]
+            right[:, d] = t[j + d + 1] - x
+            saved = 0.
+            for r in range(0, d + 1):
+                temp = b[:, r] / (right[:, r] + left[:, d - r])
+                b[:, r] = saved + right[:, r] * temp
+                saved = left[:, d - r] * temp
+            b[:, d + 1] = saved
+
+        return j - k, b
+
+
+_bases = {}
+
+
+def get_basis(xv, k=3):
+    """
+    Returns the bspline_basis for grid xv, factorized once per process.
+
+    """
+
+    xv = np.asarray(xv, dtype=float)
+    key = (k, xv.tobytes())
+    if key not in _bases:
+        _bases[key] = bspline_basis(xv, k)
+
+    return _bases[key]
+
+
+def spline1d(xv, yv, k=3):
+    """
+    Returns the interpolating spline through (xv, yv), equivalent to
+    UnivariateSpline(xv, yv, k=k, s=0), as a scipy BSpline. The factorized
+    basis for the grid xv is reused between calls, so xv should be a grid
+    which is shared across calls (e.g. a fixed redshift grid).
+
+    """
+
+    basis = get_basis(xv, k)
+    return interpolate.BSpline(basis.t, basis.coeffs(yv), k)
+
+
+def spline2d(xv, yv, f, kx=3, ky=3):
+    """
+    Returns the interpolating spline through the values f on the grid
+    (xv, yv), equivalent to RectBivariateSpline(xv, yv, f, s=0). The
+    factorized bases of both grids are reused between calls.
+
+    """
+
+    basis_x = get_basis(xv, kx)
+    basis_y = get_basis(yv, ky)
+
+    # Solve A_x C A_y^T = f for the coefficients C
+    c = basis_y.coeffs(basis_x.coeffs(f).T).T
+
+    return bspline2d(basis_x, basis_y, c)
+
+
+class bspline2d():
+    """
+    Tensor-product spline with the coefficients c on the bases basis_x and
+    basis_y (see bspline_basis), evaluated like a RectBivariateSpline:
+    spl(x, y) on the grid of the sorted 1D arrays x and y, and spl.ev(x, y)
+    at paired points. As in FITPACK, points outside the grid are clamped
+    to its edges.
+
+    """
+
+    def __init__(self, basis_x, basis_y, c):
+        self.basis_x = basis_x
+        self.basis_y = basis_y
+        self.c = c
+        self.tck = (basis_x.t, basis_y.t, c.flatten(), basis_x.k, basis_y.k)
+
+    def __call__(self, x, y, grid=True):
+        if not grid:
+            return self.ev(x, y)
+
+        x, y = np.atleast_1d(x, y)
+        return np.reshape(
+            interpolate.bisplev(x, y, self.tck), (len(x), len(y)))
+
+    def ev(self, x, y):
+        if np.ndim(x) == 0 and np.ndim(y) == 0:
+            return np.asarray(interpolate.bisplev(x, y, self.tck))
+
+        x, y = np.broadcast_arrays(
+            np.asarray(x, dtype=float), np.asarray(y, dtype=float))
+
+        ix, bx = self.basis_x.local(x.flatten())
+        iy, by = self.basis_y.local(y.flatten())
+        c = self.c[
+            (ix[:, None] + np.arange(bx.shape[1]))[:, :, None],
+            (iy[:, None] + np.arange(by.shape[1]))[:, None, :]]
+
+        return np.einsum('ia,ib,iab->i', bx, by, c).reshape(x.shape)
+
+
+def ev_grid(spl, x, y):
+    """
+    Returns the RectBivariateSpline spl on the (len(x), len(y)) grid of
+    the 1D arrays x and y, which need not be sorted. The spline is
+    evaluated with grid=True on the sorted axes, which is much faster than
+    .ev on the paired coordinates.
+
+    """
+
+    ix, iy = np.argsort(x), np.argsort(y)
+
+    ret = np.empty((len(x), len(y)))
+    ret[np.ix_(ix, iy)] = spl(x[ix], y[iy], grid=True)
+
+    return ret
+
+
+def loglog(xv, yv):
+    """
+    Returns a function interpolating the values yv (along their last axis)
+    at the points xv by cubic spline in (ln x, ln y), or in (ln x, y) if yv
+    is not strictly positive.
+
+    """
+
+    if np.all(yv > 0.):
+        spl = interpolate.CubicSpline(np.log(xv), np.log(yv), axis=-1)
+        return lambda x: np.exp(spl(np.log(x)))
+
+    spl = interpolate.CubicSpline(np.log(xv), yv, axis=-1)
+    return lambda x: spl(np.log(x))
+
+
+def adaptive_loglog(f, x, tol=1.e-4, n=8):
+    """
+    Returns (f(x), neval) for a smooth function f, reconstructed by cubic
+    spline interpolation in (ln x, ln f) from an adaptively refined set of
+    anchor points, together with the number neval of true evaluations of f.
+    With no more than n distinct points, f is evaluated at them directly.
+
+    The anchors start as n log-spaced points spanning x. The midpoint (in
+    ln x) of every interval which still contains requested points is
+    evaluated, and the interval is split further while the interpolant
+    disagrees with the fresh evaluation by more than tol (relative). If f
+    is not strictly positive at the anchors, f itself is interpolated.
+
+    f is called with arrays of points.
+
+    """
+
+    assert(n >= 4)
+
+    x = np.asarray(x, dtype=float)
+    xs = np.unique(x)
+
+    if len(xs) <= n:
+        ys = np.asarray(f(xs), dtype=float)
+        return ys[np.searchsorted(xs, x)], len(xs)
+
+    xa = np.exp(np.linspace(np.log(xs[0]), np.log(xs[-1]), n))
+    xa[[0, -1]] = xs[[0, -1]]
+    ya = np.asarray(f(xa), dtype=float)
+    neval = n
+
+    todo = np.ones(n - 1, dtype=bool)
+    while True:
+        # Only intervals with requested points strictly inside matter
+        inside = (
+            np.searchsorted(xs, xa[1:], side='left') -
+            np.searchsorted(xs, xa[:-1], side='right')) > 0
+        idx = np.where(todo & inside)[0]
+        if len(idx) == 0:
+            break
+
+        xm = np.sqrt(xa[idx] * xa[idx + 1])
+        ym = np.asarray(f(xm), dtype=float)
+        neval += len(xm)
+
+        bad = np.abs(loglog(xa, ya)(xm) - ym) > tol * np.abs(ym)
+
+        xa = np.insert(xa, idx + 1, xm)
+        ya = np.insert(ya, idx + 1, ym)
+
+        # The j-th split interval now sits at idx[j] + j and idx[j] + j + 1
+        todo = np.zeros(len(xa) - 1, dtype=bool)
+        pos = idx + np.arange(len(idx))
+        todo[pos] = bad
+        todo[pos + 1] = bad
+
+    return loglog(xa, ya)(x), neval
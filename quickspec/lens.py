@@ -28,5 +28,13 @@ class kern():
         return self._xlss
 
 
+    separable = True
+
+    def f_lx(self, l, x):
+        return (x / l)**2
+
+    def g_xz(self, x, z):
+        return self.cfac * (1. + z) * (1. / x - 1. / self.xlss)
+
     def w_lxz(self, l, x, z):
-        return self.cfac * (1. + z) * (x / l)**2 * (1. / x - 1. / self.xlss)
+        return self.f_lx(l, x) * self.g_xz(x, z)
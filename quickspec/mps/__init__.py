@@ -1,2 +1,3 @@
 from .import lin
 from .pd import mps_pd as pd
+from .halofit import mps_halofit as halofit
@@ -1,9 +1,8 @@
 # Fitting formulae for linear matter power spectra in CDM + Baryon cosmologies, from Bardeen, Bond, Kaiser, Szalay (1986)
 
 import numpy as np
-from scipy import interpolate
-
 from . import mps
+from .. import interp, util
 
 
 class mps_lin_bbks(mps.mps_lin):
@@ -26,19 +25,37 @@ class mps_lin_bbks(mps.mps_lin):
         self.arr_z = np.array([
             0.0, 0.5, 1., 1.5, 2., 3., 4., 6., 8., 12., 16., 32., 64., 128.,
             256., 512., 1300.])
-        self.arr_h = np.array([
-            self.cosmo.G_z(z)**2 * (1. + z)**2 for z in self.arr_z])
-        self.spl_h = interpolate.UnivariateSpline(
-            self.arr_z, self.arr_h, k=3, s=0)
+        self.arr_h = self.cosmo.G_z(self.arr_z)**2 * (1. + self.arr_z)**2
+        self.spl_h = interp.spline1d(self.arr_z, self.arr_h)
 
         self.norm = 1.0
         tsigma8 = self.sigma_rz(8. / cosmo.h, 0.0)
         self.norm = sigma8 / tsigma8
 
     def p_kz(self, k, z):
+        return self.transfer_k(k) * self.spl_h(z) / (1. + z)**2
+
+    def p_kz_grid(self, k, z):
+        """
+        Returns the power spectrum on the (len(k), len(z)) grid of
+        wavenumbers k (in Mpc^{-1}) and redshifts z, as the outer product
+        of its k- and z-dependent factors.
+
+        """
+
+        k, z = util.grid(k, z)
+        return np.outer(self.transfer_k(k), self.spl_h(z) / (1. + z)**2)
+
+    def transfer_k(self, k):
+        """
+        Returns the k-dependent factor of the power spectrum at wavenumber
+        k (in Mpc^{-1}), including the normalization.
+
+        """
+
         q = k * self.cosmo.h / self.gamma
         bbks = (
             np.log(1. + 2.34 * q) / (2.24 * q) *
             (1. + 3.89 * q + (16.1 * q)**2 + (5.46 * q)**3 + (6.71*q)**4)**(-0.25))
 
-        return k**self.n * bbks**2 * self.norm**2 * self.spl_h(z) / (1. + z)**2
+        return k**self.n * bbks**2 * self.norm**2
@@ -4,7 +4,9 @@
 # Code adapted from http://background.uchicago.edu/~whu/transfer/power.c
 
 import numpy as np
+from scipy import integrate
 
+from .. import util
 from . import mps
 
 
@@ -18,6 +20,10 @@ class mps_lin_eihu(mps.mps_lin):
 
         self.cosmo = cosmo
 
+        # Transfer function of the last k grid passed to p_kz_grid
+        self._transfer_key = None
+        self._transfer = None
+
         theta_cmb = 2.728 / 2.7  # Assume T_cmb = 2.728 K
 
         num_degen_hdm = 1.0
@@ -89,6 +95,56 @@ class mps_lin_eihu(mps.mps_lin):
             self.norm = sigma8 / tsigma8
 
     def p_kz(self, kk, z):
+        if np.all(self.f_hdm == 0):
+            # Without massive neutrinos, the spectrum separates into a k-only
+            # and a z-only factor.
+            return self.transfer_k(kk) * self.growth_z(z)**2
+
+        growth_k0, growth_to_z0 = self.growth_k0_z(z)
+
+        qq = kk / self.omhh * (self.theta_cmb)**2
+
+        # Compute the scale-dependent growth functions
+        y_freestream = (
+            17.2 * self.f_hdm * (1. + 0.488 * self.f_hdm**(-7.0 / 6.0)) *
+            (self.num_degen_hdm * qq / self.f_hdm)**2)
+        temp1 = growth_k0**(1. - self.p_cb)
+        temp2 = (growth_k0 / (1. + y_freestream))**(0.7)
+        growth_cb = (1. + temp2)**(self.p_cb / 0.7) * temp1
+
+        # Now compute the CDM+HDM+baryon transfer functions
+        tf_cb = self.tf_master_k(kk) * growth_cb / growth_k0
+        return self.prefactor_k(kk) * (tf_cb * growth_to_z0)**2
+
+    def p_kz_grid(self, k, z):
+        """
+        Returns the power spectrum on the (len(k), len(z)) grid of
+        wavenumbers k (in Mpc^{-1}) and redshifts z, as the outer product
+        of transfer_k(k) and growth_z(z)**2. The transfer function of the
+        last k grid is kept on the object, and reused if the same grid (and
+        normalization) is passed again.
+
+        """
+
+        k, z = util.grid(k, z)
+
+        if np.any(self.f_hdm != 0):
+            return self.p_kz(k[:, None], z[None, :])
+
+        key = (k.tobytes(), np.asarray(self.norm, dtype=float).tobytes())
+        if key != self._transfer_key:
+            self._transfer = self.transfer_k(k)
+            self._transfer_key = key
+
+        return np.outer(self._transfer, self.growth_z(z)**2)
+
+    def growth_k0_z(self, z):
+        """
+        Returns the scale-independent growth growth_k0 and its ratio to
+        today, growth_to_z0, at redshift z.
+
+        """
+
         omega_denom = self.cosmo.oml + (1. + z)**2 * (
             self.cosmo.omm * (1. + z))
         omega_lambda_z = self.cosmo.oml / omega_denom
@@ -102,19 +158,31 @@ class mps_lin_eihu(mps.mps_lin):
             (1. + self.cosmo.omm / 2.) * (1. + self.cosmo.oml / 70.))
         growth_to_z0 = growth_k0 / growth_to_z0
 
-        qq = kk / self.omhh * (self.theta_cmb)**2
+        return growth_k0, growth_to_z0
 
-        # Compute the scale-dependent growth functions
-        y_freestream = 0.0
-        if self.f_hdm != 0:
-            y_freestream = (
-                17.2 * self.f_hdm * (1. + 0.488 * self.f_hdm**(-7.0 / 6.0)) *
-                (self.num_degen_hdm * qq / self.f_hdm)**2)
-        temp1 = growth_k0**(1. - self.p_cb)
-        temp2 = (growth_k0 / (1. + y_freestream))**(0.7)
-        growth_cb = (1. + temp2)**(self.p_cb / 0.7) * temp1
-        growth_cbnu = (
-            self.f_cb**(0.7 / self.p_cb) + temp2)**(self.p_cb / 0.7) * temp1
+    def growth_z(self, z):
+        """
+        Returns the z-dependent factor of the CDM+baryon transfer function,
+        growth_cb / growth_k0 * growth_to_z0, for f_hdm = 0.
+
+        """
+
+        assert(np.all(self.f_hdm == 0))
+
+        growth_k0, growth_to_z0 = self.growth_k0_z(z)
+        growth_cb = (
+            (1. + growth_k0**(0.7))**(self.p_cb / 0.7) *
+            growth_k0**(1. - self.p_cb))
+
+        return growth_cb / growth_k0 * growth_to_z0
+
+    def tf_master_k(self, kk):
+        """
+        Returns the master transfer function at wavenumber kk (in Mpc^{-1}).
+
+        """
+
+        qq = kk / self.omhh * (self.theta_cmb)**2
 
         # Compute the master function
         gamma_eff = self.omhh * (
@@ -127,7 +195,7 @@ class mps_lin_eihu(mps.mps_lin):
         tf_sup_C = 14.4 + 325. / (1. + 60.5 * qq_eff**(1.11))
         tf_sup = tf_sup_L / (tf_sup_L + tf_sup_C * (qq_eff)**2)
 
-        if self.f_hdm != 0:
+        if np.any(self.f_hdm != 0):
             qq_nu = 3.92 * qq * np.sqrt(self.num_degen_hdm / self.f_hdm)
             max_fs_correction = (
                 1. + 1.2 * self.f_hdm**(0.64) *
@@ -135,15 +203,30 @@ class mps_lin_eihu(mps.mps_lin):
                 (qq_nu**(-1.6) + qq_nu**(0.8)))
         else:
             max_fs_correction = 1.0
-        tf_master = tf_sup * max_fs_correction
 
-        # Now compute the CDM+HDM+baryon transfer functions
-        tf_cb = tf_master * growth_cb / growth_k0
-        return ((
-            2997.0 * kk / self.cosmo.h)**(self.tilt + 3.) *
-            self.cosmo.h**2 * (self.deltaH * tf_cb * growth_to_z0)**2 /
+        return tf_sup * max_fs_correction
+
+    def prefactor_k(self, kk):
+        """
+        Returns the primordial and normalization factors of the power
+        spectrum at wavenumber kk (in Mpc^{-1}).
+
+        """
+
+        return (
+            (2997.0 * kk / self.cosmo.h)**(self.tilt + 3.) *
+            self.cosmo.h**2 * self.deltaH**2 /
             kk**3 * (2. * np.pi)**2 * self.norm**2)
 
+    def transfer_k(self, kk):
+        """
+        Returns the k-dependent factor of the power spectrum, such that
+        p_kz = transfer_k(k) * growth_z(z)**2 for f_hdm = 0.
+
+        """
+
+        return self.prefactor_k(kk) * self.tf_master_k(kk)**2
+
     def cobenorm(self):
         # Return the Bunn & White (1997) fit for delta_H
         # Given lambda, omega_m, qtensors, and tilt
@@ -153,3 +236,68 @@ class mps_lin_eihu(mps.mps_lin):
         return 1.94e-5 * self.cosmo.omm**(
             -0.785 - 0.05 * np.log(self.cosmo.omm)) * np.exp(
                 -0.95 * n - 0.169 * n * n)
+
+
+class mps_lin_eihu_batch():
+    def __init__(self, cosmo, deltaH=None, tilt=1, sigma8=None, nk=10000):
+        """
+        Eisenstein and Hu (1999) linear matter power spectrum for a set of
+        cosmologies, evaluated together.
+
+        Input
+        -----
+        cosmo: quickspec.cosmo.LCDMBatch object
+            Describes the set of cosmologies.
+        deltaH, tilt:
+            As for mps_lin_eihu; deltaH may be an array over cosmologies.
+        sigma8:
+            Scalar or array over cosmologies. If given, the spectra are
+            normalized to sigma8 at z = 0.
+        nk:
+            Number of points for the sigma8 integral, as in mps.sigma_rz.
+
+        """
+
+        self.cosmo = cosmo
+
+        # The fitting function is elementwise in the cosmological parameters,
+        # so the coefficients come out as columns of shape (n_cosmo, 1).
+        if deltaH is not None:
+            deltaH = np.reshape(deltaH, (-1, 1))
+        self.eihu = mps_lin_eihu(cosmo, deltaH=deltaH, tilt=tilt)
+
+        self.kmin = self.eihu.kmin
+        self.kmax = self.eihu.kmax
+
+        self.norm = np.ones((len(cosmo), 1))
+        if sigma8 is not None:
+            r = 8. / cosmo.h
+
+            dlnk = (np.log(self.kmax) - np.log(self.kmin)) / nk
+            lnks = np.arange(0, nk) * dlnk + np.log(self.kmin)
+            k = np.exp(lnks)
+            kr = k * r
+            sigma2 = integrate.simps(
+                (np.sin(kr) - kr * np.cos(kr))**2 / kr**3 *
+                self.eihu.transfer_k(k) * self.eihu.growth_z(0.)**2,
+                dx=dlnk, axis=-1)[:, None]
+            sigma2 *= 9. / (r**3 * 2. * np.pi**2)
+
+            self.norm = np.reshape(sigma8, (-1, 1)) / np.sqrt(sigma2)
+        self.eihu.norm = self.norm
+
+    def p_kz(self, k, z):
+        """
+        Returns the amplitude of the matter power spectrum on the grid of
+        wavenumbers k (in Mpc^{-1}) and redshifts z, with shape
+        (n_cosmo, n_k, n_z).
+
+        """
+
+        k = np.atleast_1d(np.asarray(k, dtype=float))
+        z = np.atleast_1d(np.asarray(z, dtype=float))
+        assert((k.ndim == 1) and (z.ndim == 1))
+
+        return (
+            self.eihu.transfer_k(k)[:, :, None] *
+            self.eihu.growth_z(z)[:, None, :]**2)
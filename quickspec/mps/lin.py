@@ -1,3 +1,4 @@
 from .mps_camb import mps_lin_camb as mps_camb
 from .eihu import mps_lin_eihu as eihu
+from .eihu import mps_lin_eihu_batch as eihu_batch
 from .bbks import mps_lin_bbks as bbks
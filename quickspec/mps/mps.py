@@ -1,6 +1,10 @@
+import functools
+
 import numpy as np
 from scipy import integrate
 
+from .. import fftlog, interp, util
+
 
 def w_k_tophat(k):
     """ return the Fourier Transform of a tophat window function. """
@@ -16,6 +20,34 @@ def dw_k_tophat(k):
     return -9. / k**4 * (np.sin(k) - k * np.cos(k)) + 3. / k**2 * np.sin(k)
 
 
+def _call_ls(func, kwargs, ls):
+    return func(ls=ls, **kwargs)
+
+
+def kernel_lxz(kern, ls, x, z):
+    """
+    Returns the kernel W(l, x, z) on the (len(ls), len(x)) grid of
+    multipoles ls and conformal distances x with redshifts z.
+
+    Every kernel provides w_lxz(l, x, z). Kernels whose l and z dependences
+    factorize set separable = True (as an attribute, or a property if it
+    depends on their parameters) and also provide f_lx(l, x) and
+    g_xz(x, z), with W(l, x, z) = f_lx(l, x) * g_xz(x, z), both accepting
+    broadcast arrays. g_xz is then evaluated once per node and reused for
+    every multipole. Other kernels are evaluated through w_lxz with
+    broadcast arrays.
+
+    """
+
+    tls = np.asarray(ls, dtype=float)[:, None]
+    if getattr(kern, 'separable', False):
+        w = kern.f_lx(tls, x) * kern.g_xz(x, z)
+    else:
+        w = kern.w_lxz(tls, x, z)
+
+    return np.broadcast_to(w, (len(tls), len(x)))
+
+
 class initial_ps(object):
     """
     Primordial power spectrum, characterized by
@@ -44,9 +76,221 @@ class mps():
     Base class for a matter power spectrum.
 
     """
+
+    # Domain checks on the inputs of p_kz, which can be disabled per object
+    # or temporarily with util.unchecked.
+    check_bounds = True
+
     def __init__(self):
         pass
 
+    def p_kz_grid(self, k, z):
+        """
+        Returns the power spectrum on the (len(k), len(z)) grid of
+        wavenumbers k (in Mpc^{-1}) and redshifts z. Subclasses override
+        this with separable or spline-grid evaluation; by default p_kz is
+        evaluated on the broadcast arrays.
+
+        """
+
+        k, z = util.grid(k, z)
+        return self.p_kz(k[:, None], z[None, :])
+
+    def checked_objects(self):
+        """
+        Returns the objects whose domain checks are switched off inside
+        the Limber integrands, once the integration range has been checked.
+
+        """
+        return [self, self.cosmo]
+
+    def check_limber_x(self, ls, xmin, xmax, kz=True):
+        """
+        Checks that a Limber integral from conformal distance xmin to xmax
+        (both in Mpc) at multipoles ls stays within the tabulated ranges of
+        the cosmology and, unless kz=False, of the power spectrum.
+
+        """
+
+        assert(xmin >= self.cosmo.xmin)
+        assert(xmax <= self.cosmo.xmax)
+        if not kz:
+            return
+
+        zmin, zmax = self.cosmo.spl_z_x(np.array([xmin, xmax]))
+        self.check_limber_kz(ls, xmin, xmax, max(zmin, 0.), zmax)
+
+    def check_limber_z(self, ls, zmin, zmax, kz=True):
+        """
+        Checks that a Limber integral from redshift zmin to zmax at
+        multipoles ls stays within the tabulated ranges of the cosmology and,
+        unless kz=False, of the power spectrum.
+
+        """
+
+        assert(zmin >= self.cosmo.zmin)
+        assert(zmax <= self.cosmo.zmax)
+        if not kz:
+            return
+
+        xmin, xmax = self.cosmo.spl_x_z(np.array([zmin, zmax]))
+        self.check_limber_kz(ls, max(xmin, 0.), xmax, zmin, zmax)
+
+    def check_kz(self, k, z):
+        """
+        Checks that the wavenumbers k (in Mpc^{-1}) and redshifts z lie
+        within the tabulated ranges of the power spectrum, as far as it
+        declares them (kmin, kmax, zmin, zmax), unless check_bounds is off.
+
+        """
+
+        if not self.check_bounds:
+            return
+
+        if hasattr(self, 'kmin'):
+            assert(np.all(k >= self.kmin))
+            assert(np.all(k <= self.kmax))
+        if hasattr(self, 'zmin'):
+            assert(np.all(z >= self.zmin))
+            assert(np.all(z <= self.zmax))
+
+    def check_limber_kz(self, ls, xmin, xmax, zmin, zmax):
+        """
+        Checks the redshifts and the wavenumbers l/x probed by a Limber
+        integral against the range of the power spectrum. Wavenumbers above
+        kmax are checked here for xmin > 0. For xmin = 0 they depend on the
+        smallest distance at which the integrand is actually evaluated, and
+        are checked afterwards with check_limber_kmax.
+
+        """
+
+        if hasattr(self, 'zmin'):
+            assert(zmin >= self.zmin)
+            assert(zmax <= self.zmax)
+
+        if hasattr(self, 'kmin'):
+            assert(np.min(ls) / xmax >= self.kmin)
+        if xmin > 0.:
+            self.check_limber_kmax(ls, xmin)
+
+    def check_limber_kmax(self, ls, x):
+        """
+        Checks that the wavenumbers ls/x lie below kmax, for the smallest
+        distance x (in Mpc, scalar or one per multipole) at which a Limber
+        integrand was evaluated. The integrands run without the domain
+        checks of p_kz, and spline-based spectra would otherwise clamp k to
+        the edge of their table without an error.
+
+        """
+
+        if hasattr(self, 'kmax'):
+            assert(np.all(np.asarray(ls) / x <= self.kmax))
+
+    def kernel_zrange(self, kern, l, zmin, zmax, n=1000, rtol=1.e-10):
+        """
+        Returns the redshift range (zlo, zhi) within [zmin, zmax] outside of
+        which the kernel vanishes. Kernels may declare it as an attribute
+        zrange = (zlo, zhi). Otherwise it is detected by sampling
+        w_lxz(l, x, z) at n points equally spaced in x, keeping the samples
+        where |W| exceeds rtol times its maximum and one sample on either
+        side. This requires the kernel to accept arrays, see kernel_lxz.
+        Samples where W is not finite (e.g. 1/x at x = 0) are ignored.
+
+        """
+
+        zrange = getattr(kern, 'zrange', None)
+        if zrange is not None:
+            return max(zmin, zrange[0]), min(zmax, zrange[1])
+
+        xlo, xhi = self.cosmo.x_z(np.array([zmin, zmax]))
+        x = np.linspace(xlo, xhi, n)
+        z = np.concatenate([[zmin], self.cosmo.z_x(x[1:-1]), [zmax]])
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            w = np.abs(kernel_lxz(kern, [l], x, z)[0])
+        w[~np.isfinite(w)] = 0.
+        idx = np.where(w > rtol * np.max(w))[0]
+        if len(idx) == 0:
+            return zmin, zmin
+
+        return z[max(idx[0] - 1, 0)], z[min(idx[-1] + 1, n - 1)]
+
+    def limber_zrange(self, ls, kernels, zmin, zmax, union=False):
+        """
+        Returns the redshift range (zlo, zhi) of a Limber integral from zmin
+        to zmax at multipoles ls, narrowed to the intersection (or, with
+        union=True, the union) of the supports of the kernels (see
+        kernel_zrange) and to the redshift range of the power spectrum. The
+        range in k is applied per multipole, see limber_xlimits.
+
+        """
+
+        l = np.min(ls)
+        kernels = list(dict((id(k), k) for k in kernels).values())
+        supports = np.array([
+            self.kernel_zrange(k, l, zmin, zmax) for k in kernels])
+        if union:
+            zlo, zhi = np.min(supports[:, 0]), np.max(supports[:, 1])
+        else:
+            zlo, zhi = np.max(supports[:, 0]), np.min(supports[:, 1])
+
+        if hasattr(self, 'zmin'):
+            zlo = max(zlo, self.zmin)
+        if hasattr(self, 'zmax'):
+            zhi = min(zhi, self.zmax)
+
+        return float(zlo), float(max(zhi, zlo))
+
+    def limber_xrange(self, ls, kernels, xmin, xmax, union=False):
+        """
+        Returns the conformal distance range (xlo, xhi) of a Limber integral
+        from xmin to xmax at multipoles ls, narrowed with limber_zrange.
+
+        """
+
+        zmin, zmax = self.cosmo.z_x(np.array([xmin, xmax]))
+        zlo, zhi = self.limber_zrange(ls, kernels, zmin, zmax, union=union)
+
+        xlo = xmin if zlo <= zmin else self.cosmo.x_z(zlo)
+        xhi = xmax if zhi >= zmax else self.cosmo.x_z(zhi)
+
+        return float(xlo), float(max(xhi, xlo))
+
+    def limber_xlimits(self, ls, xmin, xmax):
+        """
+        Returns the arrays (xlo, xhi) of the range [xmin, xmax] narrowed for
+        each multipole in ls to the distances where l/x lies within
+        [kmin, kmax] of the power spectrum. The range is empty (xlo == xhi)
+        for multipoles which do not reach it.
+
+        """
+
+        ls = np.asarray(ls, dtype=float)
+        xlo, xhi = np.full(len(ls), float(xmin)), np.full(len(ls), float(xmax))
+
+        if hasattr(self, 'kmax'):
+            xlo = np.maximum(xlo, ls / self.kmax)
+        if hasattr(self, 'kmin'):
+            xhi = np.minimum(xhi, ls / self.kmin)
+
+        return xlo, np.maximum(xhi, xlo)
+
+    def limber_zlimits(self, ls, zmin, zmax):
+        """
+        Returns the arrays (zlo, zhi) of the redshift range [zmin, zmax]
+        narrowed for each multipole in ls with limber_xlimits.
+
+        """
+
+        xmin, xmax = self.cosmo.x_z(np.array([zmin, zmax]))
+        xlo, xhi = self.limber_xlimits(ls, xmin, xmax)
+
+        x = np.clip([xlo, xhi], self.cosmo.xmin, self.cosmo.xmax)
+        zlo = np.where(xlo > xmin, self.cosmo.z_x(x[0]), zmin)
+        zhi = np.where(xhi < xmax, self.cosmo.z_x(x[1]), zmax)
+
+        return zlo, np.maximum(zhi, zlo)
+
     def p_kx(self, k, x):
         """
         Returns the amplitude of the matter power spectrum at wavenumber
@@ -58,7 +302,8 @@ class mps():
     def sigma_rz(self, r, z, nk=10000):
         """
         Returns the variance in a smooth density field at redshift z on
-        scale r (in Mpc).
+        scale r (in Mpc). r and z may be arrays, which are broadcast
+        against each other.
 
         Reference:
             Cooray and Sheth (2002, arxiv:0206508), Eq. 18
@@ -68,39 +313,110 @@ class mps():
              Use dlnk for integration, nk parameter controls number of points.
 
         """
-        def integrand(lnk):
-            k = np.exp(lnk)
-            kr = k * r
-            return (np.sin(kr) - kr * np.cos(kr))**2 / kr**3 * self.p_kz(k, z)
+        return self.sigma_dsigma2_rz(r, z, nk=nk)[0]
+
+    def dsigma2_rz(self, r, z, nk=10000):
+        """
+        Returns the derivative of sigma_rz**2 with respect to r.
+
+        """
+        return self.sigma_dsigma2_rz(r, z, nk=nk)[1]
+
+    def sigma_dsigma2_rz(self, r, z, nk=10000):
+        """
+        Returns the pair (sigma_rz, dsigma2_rz) from a single pass over
+        the k grid. r and z may be arrays, which are broadcast against each
+        other. P(k, z) is evaluated once per distinct redshift on the shared
+        k grid, and the window integrals for all distinct radii are reduced
+        with a matrix product against the Simpson weights.
+
+        """
+        r, z = np.broadcast_arrays(
+            np.asarray(r, dtype=float), np.asarray(z, dtype=float))
+        ur, ir = np.unique(r.ravel(), return_inverse=True)
+        uz, iz = np.unique(z.ravel(), return_inverse=True)
 
         dlnk = (np.log(self.kmax) - np.log(self.kmin)) / nk
         lnks = np.arange(0, nk) * dlnk + np.log(self.kmin)
-        sigma2 = integrate.simps(integrand(lnks), dx=dlnk)
-        sigma2 *= 9. / (r**3 * 2. * np.pi**2)
+        k = np.exp(lnks)
 
-        return np.sqrt(sigma2)
+        # (nk, n_z) table of the power spectrum, weighted for the k integral.
+        pk = np.array([self.p_kz(k, tz) for tz in uz]).T
+        pk *= util.simps_weights(nk, dlnk)[:, None]
 
-    def dsigma2_rz(self, r, z, nk=10000):
+        kr = np.outer(ur, k)
+        sinkr = np.sin(kr)
+        wkr = sinkr - kr * np.cos(kr)
+
+        sigma2 = np.dot(wkr**2 / kr**3, pk)
+        sigma2 *= (9. / (ur**3 * 2. * np.pi**2))[:, None]
+
+        dsigma2 = np.dot((-9. * wkr / kr**3 + 3. / kr * sinkr) * wkr, pk)
+        dsigma2 *= (3. / (ur**4 * np.pi**2))[:, None]
+
+        sigma = np.sqrt(sigma2)[ir, iz].reshape(r.shape)
+        dsigma2 = dsigma2[ir, iz].reshape(r.shape)
+
+        return sigma[()], dsigma2[()]
+
+    def deltasq_fftlog(self, z, nk=4096):
         """
-        Returns the derivative of sigma_rz with respect to r.
+        Returns (k, Delta^2) with the dimensionless power spectrum
+        Delta^2(k) = k^3 P(k, z) / (2 pi^2) evaluated once on nk log-spaced
+        points between kmin and kmax, the common input of the FFTLog
+        transforms below.
 
         """
+        k = np.logspace(np.log10(self.kmin), np.log10(self.kmax), nk)
+        return k, k**3 * self.p_kz(k, z) / (2. * np.pi**2)
 
-        def integrand(lnk):
-            k = np.exp(lnk)
-            kr = k * r
-            sinkr = np.sin(kr)
-            kr_coskr = kr * np.cos(kr)
-            return (
-                -9. * (sinkr - kr_coskr) /
-                kr**3 + 3. / kr * sinkr) * (sinkr - kr_coskr) * self.p_kz(k, z)
+    def sigma_dsigma2_fftlog(self, z, nk=4096, q=1.5):
+        """
+        Returns (r, sigma, dsigma2) with sigma_rz and dsigma2_rz on the
+        log-spaced grid of radii r = 1/k (in Mpc) obtained by FFTLog from
+        a single evaluation of P(k, z) on nk points.
 
-        dlnk = (np.log(self.kmax) - np.log(self.kmin)) / nk
-        lnks = np.arange(0, nk) * dlnk + np.log(self.kmin)
-        dsigma2 = integrate.simps(integrand(lnks), dx=dlnk)
-        dsigma2 *= 3. / (r**4 * np.pi**2)
+        Radii close to 1/kmax or 1/kmin are affected by the edges of the
+        k range and should not be used.
 
-        return dsigma2
+        """
+        k, deltasq = self.deltasq_fftlog(z, nk=nk)
+        r, sigma2 = fftlog.fftlog(k, deltasq, fftlog.mellin_tophat2, q=q)
+        r, dsigma2 = fftlog.fftlog(k, deltasq, fftlog.mellin_dtophat2, q=q)
+
+        return r, np.sqrt(sigma2), dsigma2 / r
+
+    def xi_fftlog(self, z, nk=4096, q=1.5):
+        """
+        Returns (r, xi) with the 3D correlation function
+
+            xi(r) = \int dk/k Delta^2(k) j_0(k r)
+
+        on the log-spaced grid of radii r = 1/k (in Mpc), obtained by FFTLog
+        from a single evaluation of P(k, z) on nk points.
+
+        """
+        k, deltasq = self.deltasq_fftlog(z, nk=nk)
+        return fftlog.fftlog(k, deltasq, fftlog.mellin_jl(0), q=q)
+
+    def map_ls(self, func, ls, executor=None, n_workers=None, **kwargs):
+        """
+        Returns func(ls=ls, **kwargs), evaluated in parallel on contiguous
+        chunks of ls and concatenated in the original order. There is one
+        chunk per worker, so that the spectrum and kernels are pickled once
+        per worker rather than once per multipole.
+
+        The executor and n_workers are passed to util.map_chunks. Process
+        pools require picklable kernels (e.g. no lambda dndz). In a thread
+        pool, func runs concurrently on the same objects, so it must not
+        switch their domain checks (see util.unchecked); the range is
+        checked once by the caller instead.
+
+        """
+
+        return util.map_chunks(
+            functools.partial(_call_ls, func, kwargs), ls,
+            executor=executor, n_workers=n_workers)
 
     def cl_limber_xl(self, l, k1, k2=None, xmin=0.0, xmax=13000.):
         """
@@ -110,33 +426,276 @@ class mps():
 
         """
 
+        if k2 is None:
+            k2 = k1
+
+        if self.check_bounds:
+            self.check_limber_x(l, xmin, xmax)
+
+        with util.unchecked(*self.checked_objects()):
+            cl, xnode = self._limber_xl(l, k1, k2, xmin, xmax)
+
+        if self.check_bounds:
+            self.check_limber_kmax(l, xnode)
+
+        return cl
+
+    def _limber_xl(self, l, k1, k2, xmin, xmax):
+        """
+        Returns (C_l, xnode) for cl_limber_xl without any checks, with the
+        smallest distance xnode at which the integrand was evaluated.
+
+        """
+
+        xnode = [xmax]
 
         def integrand(x):
+            xnode[0] = min(xnode[0], x)
             z = self.cosmo.z_x(x)
-            k1_lxz = k1.w_lxz(l, x, z)
-            if k2 is None:
-                k2_lxz = k1_lxz
-            else:
-                k2_lxz = k1.w_lxz(l, x, z)
-
             return (
-                1. / x**2 * k1_lxz * k2_lxz * self.p_kz(l / x, z))
+                1. / x**2 * k1.w_lxz(l, x, z) * k2.w_lxz(l, x, z) *
+                self.p_kz(l / x, z))
+
+        return integrate.quad(integrand, xmin, xmax, limit=100)[0], xnode[0]
+
+    def limber_x_grid(
+            self, ls, xmin=0., xmax=13000., npanels=32, order=8,
+            klimits=False):
+        """
+        Returns (x, z, wp) for the grid Limber integral over conformal
+        distance: the Gauss-Legendre nodes x (in Mpc) on npanels equal
+        panels between xmin and xmax, the redshift z at each node, and the
+        (len(ls), len(x)) matrix of quadrature weights times
+        P(l/x, z) / x^2, so that
+
+            C_l = \sum_x wp[l, x] W_1(l, x, z) W_2(l, x, z).
+
+        p_kz must accept a (len(ls), len(x)) array of k with z broadcast
+        along its rows. With klimits=True, the nodes where l/x lies outside
+        [kmin, kmax] of the power spectrum get zero weight.
+
+        """
+        x, w = util.gauss_legendre(
+            np.linspace(xmin, xmax, npanels + 1), order)
+        z = self.cosmo.z_x(x)
+
+        k = np.asarray(ls, dtype=float)[:, None] / x
+        if not klimits:
+            return x, z, w / x**2 * self.p_kz(k, z)
 
-        return integrate.quad(integrand, xmin, xmax, limit=100)[0]
+        kmin, kmax = getattr(self, 'kmin', 0.), getattr(self, 'kmax', np.inf)
+        inside = (k >= kmin) & (k <= kmax)
+        wp = w / x**2 * self.p_kz(np.clip(k, kmin, kmax), z)
+
+        return x, z, np.where(inside, wp, 0.)
 
     def cl_limber_x(
             self,
             k1, k2=None,
             ls=None,
-            xmin=0., xmax=13000.):
+            xmin=0., xmax=13000.,
+            method='quad', npanels=32, order=8,
+            executor=None, n_workers=None, support=False):
+        """
+        Calculate the cross-spectrum between kernels k1 and k2 in the
+        Limber approximation for every multipole in ls.
+
+        Input
+        -----
+        method:
+            'quad' integrates each multipole adaptively with cl_limber_xl.
+            'grid' evaluates the kernels (see kernel_lxz) and P(l/x, z)
+            once on the (l, x) grid of limber_x_grid and sums with fixed
+            Gauss-Legendre weights, which requires the kernels and p_kz to
+            accept broadcast arrays.
+        npanels, order:
+            Number of panels and nodes per panel for method='grid'.
+        executor, n_workers:
+            If either is given, the multipoles are split over a pool of
+            workers with map_ls.
+        support:
+            If True, the range [xmin, xmax] is first narrowed with
+            limber_xrange to the support of the kernels and the redshift
+            range of the power spectrum, and then for each multipole to
+            the range of the power spectrum in k (see limber_xlimits), so
+            that P is taken to vanish outside its range.
+
+        """
+
+        assert(method in ['quad', 'grid'])
+
+        if k2 is None:
+            k2 = k1
 
         if ls is None:
             ls = np.arange(20, 2048, 20)
 
-        powerspec = np.array([
-            self.cl_limber_xl(l, k1, k2, xmin, xmax) for l in ls])
+        if self.check_bounds:
+            self.check_limber_x(ls, xmin, xmax, kz=not support)
+
+        if support:
+            xmin, xmax = self.limber_xrange(ls, [k1, k2], xmin, xmax)
+            if xmin >= xmax:
+                return np.zeros(len(ls))
+
+        kwargs = dict(
+            k1=k1, k2=k2, xmin=xmin, xmax=xmax, method=method,
+            npanels=npanels, order=order, support=support)
+
+        # The checks are switched off once here, and not by the workers,
+        # which share the cosmology and spectrum in a thread pool.
+        with util.unchecked(*self.checked_objects()):
+            if (executor is not None) or (n_workers is not None):
+                ret = self.map_ls(
+                    self._limber_x_chunk, ls, executor=executor,
+                    n_workers=n_workers, **kwargs)
+            else:
+                ret = self._limber_x_chunk(ls, **kwargs)
+
+        if self.check_bounds and not support:
+            self.check_limber_kmax(ls, ret[:, 1])
+
+        return ret[:, 0]
+
+    def _limber_x_chunk(
+            self, ls, k1, k2, xmin, xmax, method, npanels, order, support):
+        """
+        Returns the (len(ls), 2) array of (C_l, xnode) for cl_limber_x
+        without any checks, with the smallest distance xnode at which each
+        integrand was evaluated.
 
-        return powerspec
+        """
+
+        if method == 'grid':
+            x, z, wp = self.limber_x_grid(
+                ls, xmin, xmax, npanels=npanels, order=order,
+                klimits=support)
+            cl = np.sum(
+                wp * kernel_lxz(k1, ls, x, z) * kernel_lxz(k2, ls, x, z),
+                axis=1)
+            return np.array([cl, np.full(len(cl), x[0])]).T
+
+        if support:
+            xlo, xhi = self.limber_xlimits(ls, xmin, xmax)
+        else:
+            xlo, xhi = np.full(len(ls), xmin), np.full(len(ls), xmax)
+
+        return np.array([
+            self._limber_xl(l, k1, k2, lo, hi) if lo < hi else (0., hi)
+            for l, lo, hi in zip(ls, xlo, xhi)]).reshape(-1, 2)
+
+    def cl_limber_x_multi(
+            self,
+            kernels,
+            ls=None,
+            xmin=0., xmax=13000.,
+            npanels=32, order=8, support=False):
+        """
+        Returns the (N, N, len(ls)) tensor of all auto- and cross-spectra
+        between the N kernels in the Limber approximation, using the grid
+        of limber_x_grid. Each kernel and P(l/x, z) are evaluated once.
+        With support=True the range is narrowed to the union of the kernel
+        supports, see limber_xrange, and the nodes outside the range of the
+        power spectrum in k get zero weight, see limber_x_grid.
+
+        """
+
+        if ls is None:
+            ls = np.arange(20, 2048, 20)
+
+        if self.check_bounds:
+            self.check_limber_x(ls, xmin, xmax, kz=not support)
+
+        if support:
+            xmin, xmax = self.limber_xrange(
+                ls, kernels, xmin, xmax, union=True)
+            if xmin >= xmax:
+                return np.zeros((len(kernels), len(kernels), len(ls)))
+
+        with util.unchecked(*self.checked_objects()):
+            x, z, wp = self.limber_x_grid(
+                ls, xmin, xmax, npanels=npanels, order=order,
+                klimits=support)
+            ws = np.array([kernel_lxz(k, ls, x, z) for k in kernels])
+
+        if self.check_bounds and not support:
+            self.check_limber_kmax(ls, x[0])
+
+        return np.einsum('ilx,jlx,lx->ijl', ws, ws, wp, optimize=True)
+
+    def cl_nonlimber_x(
+            self,
+            k1, k2=None,
+            ls=None,
+            lswitch=50,
+            xmin=0., xmax=13000.,
+            nx=4096, kmin=1.e-5, kmax=10., q=1., kref=1.e-3,
+            **kwargs):
+        """
+        Calculate the cross-spectrum between kernels k1 and k2 for every
+        multipole in ls, without the Limber approximation for l < lswitch,
+
+            C_l = 2/pi \int dk k^2 P(k, 0) I_1(k) I_2(k),
+            I_i(k) = \int dx W_i(l, x, z) D(z)/D(0) j_l(k x),
+
+        and with cl_limber_x (receiving the remaining keyword arguments)
+        for l >= lswitch. The growth D(z)/D(0) = sqrt(P(kref, z)/P(kref, 0))
+        is taken to be scale-independent, and the kernels are evaluated at
+        the given l with kernel_lxz, which is exact for kernels without
+        l-dependence (galaxies, CIB).
+
+        The I_i are computed by FFTLog from nx log-spaced distances between
+        1/kmax and 1/kmin, so that the k integral covers [kmin, kmax]. The
+        kernels are sampled inside their support (see limber_xrange) and
+        set to zero elsewhere.
+
+        """
+
+        if k2 is None:
+            k2 = k1
+
+        if ls is None:
+            ls = np.arange(20, 2048, 20)
+
+        ls = np.asarray(ls)
+        ret = np.zeros(len(ls))
+
+        low = ls < lswitch
+        if np.any(~low):
+            ret[~low] = self.cl_limber_x(
+                k1, k2, ls=ls[~low], xmin=xmin, xmax=xmax, **kwargs)
+        if not np.any(low):
+            return ret
+
+        if hasattr(self, 'kmin'):
+            kmin = max(kmin, self.kmin)
+        if hasattr(self, 'kmax'):
+            kmax = min(kmax, self.kmax)
+
+        x = np.logspace(np.log10(1. / kmax), np.log10(1. / kmin), nx)
+        xlo, xhi = self.limber_xrange(
+            ls[low], [k1, k2], max(xmin, self.cosmo.xmin), xmax, union=True)
+        inside = (x >= xlo) & (x <= xhi)
+        z = self.cosmo.z_x(x[inside])
+
+        with util.unchecked(*self.checked_objects()):
+            growth = np.sqrt(self.p_kz(kref, z) / self.p_kz(kref, 0.))
+            k = 1. / x[::-1]
+            weights = util.simps_weights(nx, np.log(k[1] / k[0]))
+            weights *= 2. / np.pi * k**3 * self.p_kz(k, 0.)
+
+            def transform(kern, l):
+                f = np.zeros(nx)
+                f[inside] = kernel_lxz(
+                    kern, [l], x[inside], z)[0] * growth * x[inside]
+                return fftlog.fftlog(x, f, fftlog.mellin_jl(l), q=q)[1]
+
+            for il in np.where(low)[0]:
+                i1 = transform(k1, ls[il])
+                i2 = i1 if k2 is k1 else transform(k2, ls[il])
+                ret[il] = np.sum(weights * i1 * i2)
+
+        return ret
 
     def cl_limber_zl(self, l, k1, k2=None, zmin=0.0, zmax=1100.):
         """
@@ -148,28 +707,136 @@ class mps():
         if k2 is None:
             k2 = k1
 
+        if self.check_bounds:
+            self.check_limber_z(l, zmin, zmax)
+
+        with util.unchecked(*self.checked_objects()):
+            cl, xnode = self._limber_zl(l, k1, k2, zmin, zmax)
+
+        if self.check_bounds:
+            self.check_limber_kmax(l, xnode)
+
+        return cl
+
+    def _limber_zl(self, l, k1, k2, zmin, zmax):
+        """
+        Returns (C_l, xnode) for cl_limber_zl without any checks, with the
+        smallest distance xnode at which the integrand was evaluated.
+
+        """
+
+        xnode = [np.inf]
+
         def integrand(z):
             x = self.cosmo.x_z(z)
+            xnode[0] = min(xnode[0], x)
             return (
                 1. / x**2 / self.cosmo.H_z(z) * 3.e5 * k1.w_lxz(l, x, z) *
                 k2.w_lxz(l, x, z) * self.p_kz(l / x, z))
 
-        return integrate.quad(integrand, zmin, zmax, limit=100)[0]
+        return integrate.quad(integrand, zmin, zmax, limit=100)[0], xnode[0]
 
     def cl_limber_z(
             self,
             k1, k2=None,
             ls=None,
-            zmin=0., zmax=1100.):
+            zmin=0., zmax=1100.,
+            executor=None, n_workers=None, support=False):
+        """
+        Calculate the cross-spectrum between kernels k1 and k2 in the
+        Limber approximation for every multipole in ls. If executor or
+        n_workers is given, the multipoles are split over a pool of
+        workers with map_ls. With support=True, the range [zmin, zmax] is
+        first narrowed with limber_zrange, and then for each multipole with
+        limber_zlimits.
+
+        """
+
+        if k2 is None:
+            k2 = k1
+
+        if ls is None:
+            ls = np.arange(20, 2048, 20)
+
+        if self.check_bounds:
+            self.check_limber_z(ls, zmin, zmax, kz=not support)
+
+        if support:
+            zmin, zmax = self.limber_zrange(ls, [k1, k2], zmin, zmax)
+            if zmin >= zmax:
+                return np.zeros(len(ls))
+
+        kwargs = dict(k1=k1, k2=k2, zmin=zmin, zmax=zmax, support=support)
+
+        # As in cl_limber_x, the workers leave the checks alone.
+        with util.unchecked(*self.checked_objects()):
+            if (executor is not None) or (n_workers is not None):
+                ret = self.map_ls(
+                    self._limber_z_chunk, ls, executor=executor,
+                    n_workers=n_workers, **kwargs)
+            else:
+                ret = self._limber_z_chunk(ls, **kwargs)
+
+        if self.check_bounds and not support:
+            self.check_limber_kmax(ls, ret[:, 1])
+
+        return ret[:, 0]
+
+    def _limber_z_chunk(self, ls, k1, k2, zmin, zmax, support):
+        """
+        Returns the (len(ls), 2) array of (C_l, xnode) for cl_limber_z
+        without any checks, as _limber_x_chunk.
+
+        """
+
+        if support:
+            zlo, zhi = self.limber_zlimits(ls, zmin, zmax)
+        else:
+            zlo, zhi = np.full(len(ls), zmin), np.full(len(ls), zmax)
+
+        return np.array([
+            self._limber_zl(l, k1, k2, lo, hi) if lo < hi else (0., np.inf)
+            for l, lo, hi in zip(ls, zlo, zhi)]).reshape(-1, 2)
+
+    def cl_limber_x_adaptive(
+            self,
+            k1, k2=None,
+            ls=None,
+            tol=1.e-4, nanchor=8,
+            **kwargs):
+        """
+        Returns (cl, neval) with the Limber cross-spectrum of cl_limber_x
+        at every multipole in ls, interpolated in log-log from adaptively
+        refined anchor multipoles (see interp.adaptive_loglog), and the
+        number neval of multipoles which were actually integrated.
+        Further keyword arguments are passed to cl_limber_x.
+
+        """
 
         if ls is None:
             ls = np.arange(20, 2048, 20)
 
-        powerspec = np.array([
-            self.cl_limber_zl(l, k1, k2, zmin, zmax) for l in ls])
+        return interp.adaptive_loglog(
+            lambda tls: self.cl_limber_x(k1, k2, ls=tls, **kwargs),
+            ls, tol=tol, n=nanchor)
+
+    def cl_limber_z_adaptive(
+            self,
+            k1, k2=None,
+            ls=None,
+            tol=1.e-4, nanchor=8,
+            **kwargs):
+        """
+        Returns (cl, neval) as cl_limber_x_adaptive, using cl_limber_z.
+
+        """
 
-        return powerspec
+        if ls is None:
+            ls = np.arange(20, 2048, 20)
 
+        return interp.adaptive_loglog(
+            lambda tls: self.cl_limber_z(k1, k2, ls=tls, **kwargs),
+            ls, tol=tol, n=nanchor)
 
     def T_k(self, k):
         T_k = np.sqrt(self.p_kz(k, z=0) / self.sips.pR_k(k)) / k**2
@@ -178,5 +845,88 @@ class mps():
         return T_k
 
 
+class limber_operator(object):
+    def __init__(
+            self, cosmo, arr_k, arr_z,
+            k1, k2=None,
+            ls=None,
+            xmin=0., xmax=13000.,
+            npanels=32, order=8):
+        """
+        Linear operator mapping a table of the matter power spectrum
+        mat_p[i, j] = P(arr_k[i], arr_z[j]) to the Limber cross-spectrum of
+        kernels k1 and k2 at multipoles ls, on the integration grid of
+        mps.limber_x_grid. P is interpolated between the table points by a
+        bicubic spline in (ln k, z), so that applying the operator agrees
+        with cl_limber_x(..., method='grid') for a spectrum given by that
+        spline.
+
+        The table has to cover k >= l/xmax and the redshifts up to
+        z(xmax). Nodes with l/x > arr_k[-1] are dropped, i.e. P is taken
+        to vanish above the table.
+
+        Input
+        -----
+        cosmo: quickspec.cosmo.lcdm object
+            Provides the distance-redshift relation.
+        arr_k, arr_z:
+            Increasing wavenumbers (in Mpc^{-1}) and redshifts of the table.
+        k1, k2:
+            Kernels, evaluated on the nodes with kernel_lxz.
+
+        """
+
+        if k2 is None:
+            k2 = k1
+
+        if ls is None:
+            ls = np.arange(20, 2048, 20)
+
+        self.arr_k = np.asarray(arr_k, dtype=float)
+        self.arr_z = np.asarray(arr_z, dtype=float)
+        self.ls = ls
+
+        x, w = util.gauss_legendre(
+            np.linspace(xmin, xmax, npanels + 1), order)
+        z = cosmo.z_x(x)
+        tls = np.asarray(ls, dtype=float)[:, None]
+        k = tls / x
+
+        assert(np.min(k) >= self.arr_k[0])
+        assert(np.min(z) >= self.arr_z[0])
+        assert(np.max(z) <= self.arr_z[-1])
+
+        wk = (
+            w / x**2 * kernel_lxz(k1, ls, x, z) * kernel_lxz(k2, ls, x, z))
+
+        basis_k = interp.get_basis(np.log(self.arr_k))
+        basis_z = interp.get_basis(self.arr_z)
+        design_z = basis_z.design(z).tocsr()
+
+        # Operator on the spline coefficients, mat[l, i, j] =
+        # \sum_x wk[l, x] B_i(ln k[l, x]) B_j(z[x])
+        mat = np.zeros((len(ls), len(self.arr_k), len(self.arr_z)))
+        for il in range(len(ls)):
+            ix = np.where(k[il] <= self.arr_k[-1])[0]
+            design_k = basis_k.design(np.log(k[il, ix]))
+            mat[il] = (
+                design_k.T.dot(design_z[ix].multiply(wk[il, ix][:, None]))
+            ).toarray()
+
+        # Pull back to the tabulated values, C = A_k^{-1} mat_p A_z^{-T}
+        mat = basis_k.coeffs_adjoint(np.moveaxis(mat, 1, 0))
+        mat = basis_z.coeffs_adjoint(np.moveaxis(mat, 2, 0))
+        self.mat = mat.transpose(2, 1, 0)
+
+    def __call__(self, mat_p):
+        """
+        Returns the C_l for the table mat_p, with shape (len(arr_k),
+        len(arr_z), ...). Trailing dimensions of mat_p, e.g. for a set of
+        tables, are kept in the output.
+
+        """
+        return np.tensordot(self.mat, mat_p, axes=([1, 2], [0, 1]))
+
+
 class mps_lin(mps):
     pass
@@ -1,10 +1,9 @@
 from __future__ import print_function
 
 import numpy as np
-from scipy import interpolate
 
 from . import mps
-from .. import util
+from .. import interp, util
 
 zvec_high = np.linspace(2048, 11, 20)
 zvec_low = np.linspace(10, 0, 60)
@@ -64,8 +63,8 @@ class mps_lin_camb(mps.mps_lin):
         for iz, z in enumerate(self.arr_z):
             self.mat_p[iz, :] *= (1. + z)**2
 
-        self.spl_p = interpolate.RectBivariateSpline(
-            self.arr_z, np.log(self.arr_k), self.mat_p, kx=3, ky=3, s=0)
+        # Spline in ln(k/h), whose grid is shared between cosmologies.
+        self.spl_p = interp.spline2d(self.arr_z, np.log(kh), self.mat_p)
 
         self.kmin = self.arr_k[+0] * 0.999
         self.kmax = self.arr_k[-1] * 1.001
@@ -80,12 +79,23 @@ class mps_lin_camb(mps.mps_lin):
 
         """
 
-        assert(np.all(k >= self.kmin))
-        assert(np.all(k <= self.kmax))
-        assert(np.all(z >= self.zmin))
-        assert(np.all(z <= self.zmax))
+        self.check_kz(k, z)
 
         k, z, s = util.pair(k, z)
-        ret = self.spl_p.ev(z, np.log(k))
+        ret = self.spl_p.ev(z, np.log(k / self.cosmo.h))
         ret /= (1. + z)**2
         return ret.reshape(s)
+
+    def p_kz_grid(self, k, z):
+        """
+        Returns the amplitude of the matter power spectrum on the (len(k),
+        len(z)) grid of wavenumbers k (in Mpc^{-1}) and redshifts z.
+
+        """
+
+        k, z = util.grid(k, z)
+
+        self.check_kz(k, z)
+
+        ret = interp.ev_grid(self.spl_p, z, np.log(k / self.cosmo.h)).T
+        return ret / (1. + z)**2
@@ -1,12 +1,20 @@
+import functools
+
 import numpy as np
-from scipy import interpolate, optimize
+from scipy import interpolate
 
-from .. import util
+from .. import interp, util
 from . import mps
 
 
+def _lnkl_columns(pd, arr_k, zs):
+    return pd.lnkl_table(arr_k, zs)
+
+
 class mps_pd(mps.mps):
-    def __init__(self, mps, kmin=2.e-5, kmax=2.e3, npts=10, cache=False):
+    def __init__(
+            self, mps, kmin=2.e-5, kmax=2.e3, npts=10, cache=False,
+            persist=False, executor=None, n_workers=None):
         """
         Non-linear matter power spectrum using Peacock and Dodds (1996)
         fitting formula: astro-ph/9603031.
@@ -19,6 +27,16 @@ class mps_pd(mps.mps):
             Minimum and maximum wavenumber (Mpc^{-1})
         npts:
             Number of points to use for interpolation between kmin and kmax.
+        cache:
+            If True, ln k_l(k, z) is tabulated on a grid of arr_k and arr_z
+            and interpolated by spl_lnkl.
+        persist:
+            If True, the table of cache=True is stored on disk (see
+            util.cached) and loaded by later instances with the same linear
+            spectrum.
+        executor, n_workers:
+            If given, the table of cache=True is built in parallel over
+            chunks of arr_z, see util.map_chunks.
         """
 
         self.mps = mps
@@ -37,45 +55,208 @@ class mps_pd(mps.mps):
             self.arr_k = np.logspace(
                 np.log10(kmin),
                 np.log10(kmax),
-                (np.log10(kmax) - np.log10(kmin)) * npts)
+                int((np.log10(kmax) - np.log10(kmin)) * npts))
+
+            def build():
+                return self.build_lnkl(executor, n_workers)
+
+            if persist:
+                # The table depends on the linear spectrum only through its
+                # values, the cosmology through g_a, and the grid.
+                key = util.cache_key(
+                    self.mps.p_kz(self.arr_k[:, None], self.arr_z[None, :]),
+                    self.cosmo.omm, self.cosmo.oml, self.arr_k, self.arr_z)
+                self.mat_lnkl = util.cached('pd_lnkl', key, build)
+            else:
+                self.mat_lnkl = build()
+
+            self.spl_lnkl = interp.spline2d(
+                np.log(self.arr_k), self.arr_z, self.mat_lnkl)
+
+    def checked_objects(self):
+        return [self] + self.mps.checked_objects()
+
+    def build_lnkl(self, executor=None, n_workers=None):
+        """
+        Returns the table of ln k_l(k, z) on the grid (arr_k, arr_z),
+        computed by lnkl_table for all redshifts at once, or in parallel on
+        chunks of arr_z if an executor or n_workers is given.
+
+        """
+
+        if (executor is None) and (n_workers is None):
+            return self.lnkl_table(self.arr_k, self.arr_z)
+
+        return util.map_chunks(
+            functools.partial(_lnkl_columns, self, self.arr_k), self.arr_z,
+            executor=executor, n_workers=n_workers, axis=1)
+
+    def lnkl_table(self, k, zs):
+        """
+        Returns the log of the linear wavenumber k_l with k_nl(k_l, z) = k
+        on the (len(k), len(zs)) grid of wavenumbers k and redshifts zs,
+        searching k_l between kmin / 10 and kmax * 10.
+
+        """
 
-            self.mat_lnkl = np.zeros((len(self.arr_k), len(self.arr_z)))
+        lnkl, lnknl, lnd2 = self.nl_table(
+            zs, kmin=0.1 * self.kmin, kmax=10. * self.kmax)
 
-            for ik, k in util.enumerate_progress(
-                    self.arr_k, label="mps::pd::init"):
-                for iz, z in enumerate(self.arr_z):
-                    self.mat_lnkl[ik, iz] = np.log(
-                        optimize.bisect(
-                            lambda tk: (self.knl(tk, z) - k),
-                            kmin * 0.1,
-                            kmax * 10.))
-            self.spl_lnkl = interpolate.RectBivariateSpline(
-                np.log(self.arr_k), self.arr_z, self.mat_lnkl, kx=3, ky=3, s=0)
+        lnk = np.log(k)
+        iz = np.arange(len(zs))
+        lnkl = np.broadcast_to(lnkl[:, None], lnknl.shape)
+
+        return self.interp_table(
+            lnknl, lnkl, np.repeat(lnk, len(zs)), np.tile(iz, len(k))
+        ).reshape(len(k), len(zs))
 
     def p_kz(self, k, z):
         k, z, s = util.pair(k, z)
 
         if self.cache is True:
             kl = np.exp(self.spl_lnkl.ev(np.log(k), z))
+            d2 = self.d2_kl(kl, z)
         else:
-            kl = np.array([optimize.bisect(
-                lambda ttk: (self.knl(ttk, tz) - tk),
-                self.kmin,
-                self.kmax) for (tk, tz) in zip(k, z)])
+            d2 = self.d2_kz(k, z)
 
-        d2 = self.d2_kl(kl, z)
         return (d2 / k**3 * (2. * np.pi**2)).reshape(s)
 
+    def p_kz_grid(self, k, z):
+        """
+        Returns the power spectrum on the (len(k), len(z)) grid of
+        wavenumbers k and redshifts z. With cache=True, ln k_l is taken
+        from spl_lnkl on the grid.
+
+        """
+
+        if self.cache is not True:
+            return super(mps_pd, self).p_kz_grid(k, z)
+
+        k, z = util.grid(k, z)
+        kl = np.exp(interp.ev_grid(self.spl_lnkl, np.log(k), z))
+        d2 = self.d2_kl(kl, z[None, :])
+
+        return d2 / k[:, None]**3 * (2. * np.pi**2)
+
+    def d2_kz(self, k, z):
+        """
+        Returns the non-linear dimensionless power spectrum at the paired
+        arrays of wavenumbers k and redshifts z. For every distinct
+        redshift, the relation k_nl(k_l) is tabulated by nl_table, and
+        inverted by interp_table, which raises ValueError for k outside the
+        table unless check_bounds is off. The cost grows with the number of
+        distinct redshifts; for scattered redshifts use cache=True instead.
+
+        """
+
+        zs, iz = np.unique(z, return_inverse=True)
+        kmax = max(min(np.max(k), self.kmax), self.kmin)
+        _, lnknl, lnd2 = self.nl_table(zs, kmax=kmax)
+
+        return np.exp(self.interp_table(lnknl, lnd2, np.log(k), iz))
+
+    def interp_table(self, lnknl, lny, lnk, iz):
+        """
+        Returns the values lny (e.g. ln d2) tabulated by nl_table against
+        lnknl, interpolated to the log wavenumbers lnk in the columns iz
+        (paired arrays) by cubic Hermite interpolation.
+
+        """
+
+        n = lnknl.shape[0]
+
+        # Every column of lnknl increases, so offsetting column i by i times
+        # the overall span gives a single sorted array to search in.
+        span = lnknl[-1].max() - lnknl[0].min() + 1.
+        flat = (lnknl + span * np.arange(lnknl.shape[1])).T.flatten()
+        i = np.searchsorted(flat, lnk + span * iz) - iz * n - 1
+
+        if self.check_bounds and np.any((i < 0) | (i > n - 2)):
+            raise ValueError(
+                "k out of bounds. knl(kmin), knl(kmax) = (%2.2e, %2.2e)" %
+                (np.exp(lnknl[0].max()), np.exp(lnknl[-1].min())))
+        i = np.clip(i, 0, n - 2)
+
+        # slopes taken along the uniform ln k_l grid
+        dy = np.gradient(lny, axis=0) / np.gradient(lnknl, axis=0)
+
+        x0, x1 = lnknl[i, iz], lnknl[i + 1, iz]
+        h = x1 - x0
+        t = (lnk - x0) / h
+
+        return (
+            (1. + 2. * t) * (1. - t)**2 * lny[i, iz] +
+            t**2 * (3. - 2. * t) * lny[i + 1, iz] +
+            h * t * (1. - t) * ((1. - t) * dy[i, iz] - t * dy[i + 1, iz]))
+
+    def nl_table(self, zs, kmin=None, kmax=None, nsub=32):
+        """
+        Returns (lnkl, lnknl, lnd2) on the grid of linear wavenumbers
+        lnkl from kmin to kmax (default to self.kmin and self.kmax) spaced
+        by ln(2) / nsub (at least four points), and redshifts zs: the log
+        of the non-linear wavenumber k_nl(k_l) and of the non-linear
+        dimensionless power spectrum, both with shape (len(lnkl), len(zs)).
+
+        With this spacing the spectrum at k_l / 2, whose slope enters the
+        fitting formula, lies on the same grid extended by nsub points, so
+        the linear spectrum is evaluated once on the extended grid and
+        differentiated by cubic spline.
+
+        """
+
+        if kmin is None:
+            kmin = self.kmin
+        if kmax is None:
+            kmax = self.kmax
+
+        dlnk = np.log(2.) / nsub
+        n = max(int(np.ceil(np.log(kmax / kmin) / dlnk)) + 2, 4)
+        lnk = np.log(0.5 * kmin) + dlnk * np.arange(n + nsub)
+
+        zs = np.asarray(zs, dtype=float)
+        lnp = np.log(self.mps.p_kz(np.exp(lnk)[:, None], zs[None, :]))
+        neff = interpolate.CubicSpline(lnk, lnp, axis=0)(lnk[:n], 1)
+
+        lnkl = lnk[nsub:]
+        x = np.exp(lnp[nsub:] + 3. * lnkl[:, None]) / (2. * np.pi**2)
+        d2 = self.d2_nl(x, 1. + neff / 3., self.g_a(1. / (1. + zs)))
+
+        lnknl = lnkl[:, None] + np.log1p(d2) / 3.
+        assert(np.all(np.diff(lnknl, axis=0) > 0.))
+
+        return lnkl, lnknl, np.log(d2)
+
     def knl(self, kl, z):
         d2 = self.d2_kl(kl, z)
 
         return kl * (1. + self.d2_kl(kl, z))**(1. / 3.)
 
     def d2_kl(self, k, z):
-        logks = np.log(0.5 * k * np.array([0.999, 1.0, 1.001]))
-        logps = np.log(self.mps.p_kz(np.exp(logks), z))
+        k = np.asarray(k, dtype=float)
+        z = np.asarray(z, dtype=float)
 
-        tn = 1. + util.deriv(logks, logps)[1] / 3.
+        # 3-point slope of ln P at k / 2, as util.deriv, for arrays of k
+        dlogks = np.log(np.array([0.999, 1.0, 1.001]))
+        weights = np.array([util.deriv(dlogks, y)[1] for y in np.eye(3)])
+        logps = np.log(self.mps.p_kz(
+            0.5 * k[..., None] * np.exp(dlogks), z[..., None]))
+
+        tn = 1. + np.dot(logps, weights) / 3.
+
+        g = self.g_a(1. / (1. + z))
+        x = self.mps.p_kz(k, z) * k**3 / (2. * np.pi**2)
+
+        return self.d2_nl(x, tn, g)
+
+    @staticmethod
+    def d2_nl(x, tn, g):
+        """
+        Returns the non-linear dimensionless power spectrum for the linear
+        one x, with tn = 1 + n_eff / 3 for the slope n_eff of the linear
+        spectrum at k / 2 and the growth suppression factor g (all
+        broadcast).
+
+        """
 
         A = 0.482 * tn**(-0.947)
         B = 0.226 * tn**(-1.778)
@@ -83,15 +264,10 @@ class mps_pd(mps.mps):
         b = 0.862 * tn**(-0.287)
         V = 11.55 * tn**(-0.423)
 
-        g = self.g_a(1. / (1. + z))
-        x = self.mps.p_kz(k, z) * k**3 / (2. * np.pi**2)
-
-        ret = (
+        return (
             x * ((1. + B * b * x + (A * x)**(a * b)) /
             (1. + ((A * x)**a * g**3 / (V * np.sqrt(x)))**b))**(1. / b))
 
-        return ret
-
     def g_a(self, a):
         # Peacock and Dodds Eq. 9, 15/16
         c = self.cosmo
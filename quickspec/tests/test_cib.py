@@ -1,7 +1,8 @@
 import numpy as np
 from numpy import testing
 
-from quickspec.cib import hall, halo
+from quickspec import cosmo, mps
+from quickspec.cib import hall, halo, bethermin_2011
 from quickspec.cib import ldp_2004 as ldp
 
 
@@ -29,3 +30,80 @@ class TestHall():
         testing.assert_almost_equal(
             hall.jbar(353e9, 1, 100),
             0.050333556661810691)
+
+    def test_kern(self):
+        planck15 = cosmo.Planck15()
+        zz = np.array([0.5, 1., 2., 4.])
+        xx = planck15.x_z(zz)
+
+        # W = b_G jbar / (1+z) for fnl = 0
+        kern = hall.ssed_kern(353.e9, b0=1.2, b1=0.3, b2=0.05)
+        assert kern.separable
+        reference = np.array([
+            (1.2 + 0.3 * z + 0.05 * z**2) / (1. + z) * hall.jbar(353.e9, z, x)
+            for x, z in zip(xx, zz)])
+
+        testing.assert_allclose(
+            mps.mps.kernel_lxz(kern, [10., 1000.], xx, zz),
+            np.array([reference, reference]), rtol=1.e-12)
+        testing.assert_allclose(
+            [kern.w_lxz(100., x, z) for x, z in zip(xx, zz)], reference,
+            rtol=1.e-12)
+
+        assert not hall.ssed_kern(353.e9, fnl=1.).separable
+
+
+class TestBethermin():
+
+    planck15 = cosmo.Planck15()
+
+    # Synthetic counts, with a flux integral quadratic in z
+    counts = bethermin_2011.counts.__new__(bethermin_2011.counts)
+    counts.ls = np.array([350, 550])
+    counts.zs = np.linspace(0., 7., 36)
+    counts.ss = np.logspace(-3., 0., 20)
+    counts.ds = np.gradient(counts.ss)
+    counts.dndsdz = (
+        (1. + counts.zs - 0.1 * counts.zs**2)[None, :, None] *
+        np.ones((2, 1, 20)))
+    counts.nu2ls = {857.e9: 350, 545.e9: 550}
+    counts._jbar_tabs = {}
+
+    def test_jbar(self):
+        smax = 0.1
+        sidx = self.counts.ss < smax
+        norm = np.sum(self.counts.ds[sidx] * self.counts.ss[sidx])
+
+        zz = np.linspace(0., 7., 101)
+        ret = self.counts.jbar(545.e9, zz, smax=smax, cosmo=self.planck15)
+        testing.assert_allclose(
+            ret,
+            (1. + zz) * norm * (1. + zz - 0.1 * zz**2) *
+            self.planck15.H_z(zz) / 3.e5, rtol=1.e-10)
+
+        testing.assert_allclose(
+            self.counts.jbar(545.e9, zz[17], smax=smax, cosmo=self.planck15),
+            ret[17], rtol=1.e-12)
+
+        testing.assert_raises(
+            ValueError, self.counts.jbar, 545.e9, 7.5, smax, self.planck15)
+
+    def test_kern(self):
+        kern = bethermin_2011.kern(545.e9, 0.1, self.planck15, self.counts)
+        assert kern.separable
+        assert kern.zrange == (0., 7.)
+
+        # W = jbar / (1+z), with the flux integral of the synthetic counts
+        sidx = self.counts.ss < 0.1
+        norm = np.sum(self.counts.ds[sidx] * self.counts.ss[sidx])
+        zz = np.linspace(0., 7., 11)
+        xx = self.planck15.x_z(zz)
+        reference = (
+            norm * (1. + zz - 0.1 * zz**2) * self.planck15.H_z(zz) / 3.e5)
+
+        testing.assert_allclose(
+            mps.mps.kernel_lxz(kern, [10., 1000.], xx, zz),
+            np.array([reference, reference]), rtol=1.e-10)
+        testing.assert_allclose(
+            [kern.w_lxz(100., x, z) for x, z in zip(xx, zz)], reference,
+            rtol=1.e-10)
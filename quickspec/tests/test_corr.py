@@ -0,0 +1,62 @@
+import numpy as np
+from numpy import testing
+from scipy import special
+
+from quickspec import corr
+
+
+class TestCorr():
+
+    # Gaussian beam, w(theta) = exp(-theta^2 / (2 sigma^2)) / (2 pi sigma^2)
+    # in the flat-sky limit
+    sigma = np.radians(10. / 60.)
+    ls = np.unique(np.logspace(0., np.log10(8. / sigma), 300).astype(int))
+    cls = np.exp(-0.5 * ls**2 * sigma**2)
+
+    def test_flat(self):
+        theta, w = corr.w_theta_flat(self.ls, self.cls)
+        sel = (theta > 0.1 * self.sigma) & (theta < 3. * self.sigma)
+        testing.assert_allclose(
+            w[sel],
+            np.exp(-0.5 * theta[sel]**2 / self.sigma**2) /
+            (2. * np.pi * self.sigma**2),
+            rtol=1.e-3, atol=1.e-6 * w[0])
+
+    def test_exact(self):
+        # the flat-sky limit of the sum over l matches the integral over
+        # l + 1/2
+        theta, w = corr.w_theta_flat(self.ls + 0.5, self.cls)
+        sel = np.where(
+            (theta > 0.1 * self.sigma) & (theta < 3. * self.sigma))[0][::20]
+
+        testing.assert_allclose(
+            corr.w_theta_exact(self.ls, self.cls, theta[sel]), w[sel],
+            rtol=1.e-3, atol=1.e-6 * w[0])
+
+        # xi_+ and xi_- against J_0 and J_4
+        for nu, mp in [(0, 2), (4, -2)]:
+            theta, w = corr.w_theta_flat(self.ls + 0.5, self.cls, nu=nu)
+            testing.assert_allclose(
+                corr.w_theta_exact(self.ls, self.cls, theta[sel], 2, mp),
+                w[sel], atol=1.e-3 * np.max(np.abs(w[sel])))
+
+    def test_wigner(self):
+        theta = np.array([0.01, 0.3, 1., 2.5])
+        c = np.cos(theta)
+        ls = np.arange(2, 41)
+
+        def wigner_d(l, m, mp):
+            cls = np.where(ls == l, 4. * np.pi / (2. * l + 1.), 0.)
+            return corr.w_theta_exact(ls, cls, theta, m, mp)
+
+        testing.assert_allclose(
+            wigner_d(20, 0, 0), special.eval_legendre(20, c), rtol=1.e-10)
+        testing.assert_allclose(
+            wigner_d(3, 2, 2), (1. + c)**2 * (3. * c - 2.) / 4., rtol=1.e-10)
+        testing.assert_allclose(
+            wigner_d(3, 2, -2), (1. - c)**2 * (3. * c + 2.) / 4.,
+            rtol=1.e-10)
+        testing.assert_allclose(
+            wigner_d(10, 2, 0),
+            special.lpmv(2, 10, c) / np.sqrt(9. * 10. * 11. * 12.),
+            rtol=1.e-10)
@@ -1,7 +1,8 @@
 import numpy as np
 from numpy import testing
+from scipy import integrate
 
-from quickspec import cosmo
+from quickspec import cosmo, units
 
 class TestPlanck15():
     planck15 = cosmo.Planck15()
@@ -33,6 +34,12 @@ class TestLCDM():
         testing.assert_almost_equal(self.lcdm.t_z(0), 13.4514119711)
         testing.assert_almost_equal(self.lcdm.t_z(1), 5.74499627)
 
+        # Vectorized, and inverse
+        zs = np.array([0.1, 1., 10., 1000.])
+        ts = self.lcdm.t_z(zs)
+        testing.assert_almost_equal(ts[1], 5.74499627)
+        testing.assert_allclose(self.lcdm.z_t(ts), zs, rtol=1.e-8)
+
     def test_x_z(self):
         # x to z
         testing.assert_almost_equal(self.lcdm.x_z(1.), 3303.8288058874678)
@@ -52,6 +59,46 @@ class TestLCDM():
             zvec,
             self.lcdm.z_x(self.lcdm.x_z(zvec)))
 
+    def test_xvec(self):
+        # Cumulative table against direct integration from z=0
+        for iz in [1, 100, 499, 650, 799]:
+            x = integrate.quad(
+                lambda z: (units.c * 1.e-3) / self.lcdm.H_z(z),
+                0., self.lcdm.zvec[iz])[0]
+            testing.assert_allclose(self.lcdm.xvec[iz], x, rtol=1.e-10)
+
+    def test_lazy(self):
+        lcdm = cosmo.LCDM(lazy=True)
+        assert lcdm._xvec is None
+
+        # Background quantities do not need the distance table
+        assert lcdm.H_z(0.) == lcdm.H0
+        testing.assert_almost_equal(lcdm.Dv_mz(0), 337.14293073202816)
+        assert lcdm._xvec is None
+
+        # Tables are built on first access
+        testing.assert_almost_equal(lcdm.x_z(1.), 3303.8288058874678)
+        testing.assert_array_equal(lcdm.xvec, self.lcdm.xvec)
+        assert lcdm.xmax == self.lcdm.xmax
+
+    def test_cache(self, tmpdir, monkeypatch):
+        monkeypatch.setenv('QUICKSPEC_DATA', str(tmpdir))
+
+        lcdm = cosmo.LCDM(cache=True)
+        lcdm.G_z(1.)
+        assert len(tmpdir.join('cache', 'lcdm_xvec').listdir()) == 1
+        assert len(tmpdir.join('cache', 'lcdm_lngvec').listdir()) == 1
+
+        # Later constructions memory-map the stored tables
+        lcdm2 = cosmo.LCDM(cache=True)
+        assert isinstance(lcdm2.xvec, np.memmap)
+        testing.assert_array_equal(lcdm2.xvec, self.lcdm.xvec)
+        testing.assert_almost_equal(lcdm2.G_z(0), 0.77898101676855247)
+
+        # Different parameters get their own entry
+        cosmo.LCDM(omc=0.2, oml=0.75, cache=True)
+        assert len(tmpdir.join('cache', 'lcdm_xvec').listdir()) == 2
+
     def test_H(self):
         # H_a
         assert self.lcdm.H_a(1.) ==  self.lcdm.H0
@@ -74,6 +121,33 @@ class TestLCDM():
         testing.assert_almost_equal(self.lcdm.G_x(0), 0.77898101676855247)
         testing.assert_almost_equal(self.lcdm.G_x(1000), 0.68504721436132821)
 
+        # Tabulated growth against the direct integral (Dodelson Eq. 7.77)
+        zs = np.array([0., 0.5, 2., 10., 300., 1100.])
+
+        def G_quad(z):
+            integral = integrate.quad(
+                lambda a: (self.lcdm.H0 / (a * self.lcdm.H_a(a)))**3,
+                0, 1. / (1. + z))[0]
+            return (
+                2.5 * self.lcdm.omm * self.lcdm.H_a(1. / (1. + z)) /
+                self.lcdm.H0 * integral)
+
+        testing.assert_allclose(
+            self.lcdm.G_z(zs), [G_quad(z) for z in zs], rtol=1.e-8)
+
+    def test_f(self):
+        # Growth rate against a finite difference of ln G in ln a
+        zs = np.array([0., 0.5, 2., 10.])
+        lna = -np.log(1. + zs)
+        dlna = 1.e-4
+        f = (
+            np.log(self.lcdm.G_z(np.exp(-lna - dlna) - 1.)) -
+            np.log(self.lcdm.G_z(np.exp(-lna + dlna) - 1.))) / (2. * dlna)
+        testing.assert_allclose(self.lcdm.f_z(zs), f, rtol=1.e-6)
+
+        # Matter domination
+        testing.assert_almost_equal(self.lcdm.f_z(1000.), 1., decimal=3)
+
     def test_Dv_mz(self):
         # Virial overdensity w.r.t. the mean matter density at redshift z.
         testing.assert_almost_equal(self.lcdm.Dv_mz(0), 337.14293073202816)
@@ -82,3 +156,37 @@ class TestLCDM():
     def test_aeg_lm(self):
         # scale factor at lambda - matter equality.
         testing.assert_almost_equal(self.lcdm.aeq_lm(), 0.7539474411291538)
+
+
+class TestLCDMBatch():
+
+    omb = np.array([0.0486, 0.05, 0.045])
+    omc = np.array([0.2589, 0.25, 0.3])
+    oml = 1. - omb - omc
+    H0 = np.array([67.7, 70., 72.])
+    batch = cosmo.LCDMBatch(omb=omb, omc=omc, oml=oml, H0=H0)
+
+    def test_initvals(self):
+        assert len(self.batch) == 3
+        assert self.batch.omm.shape == (3, 1)
+        assert self.batch[1].omc == 0.25
+        assert self.batch[1].H0 == 70.
+
+    def test_against_lcdm(self):
+        zs = np.array([2., 0.1, 1., 1000.])
+
+        H = self.batch.H_z(zs)
+        x = self.batch.x_z(zs)
+        G = self.batch.G_z(zs)
+        f = self.batch.f_z(zs)
+        assert x.shape == (3, 4)
+
+        for i in range(3):
+            lcdm = cosmo.LCDM(
+                omb=self.omb[i], omc=self.omc[i], oml=self.oml[i],
+                H0=self.H0[i])
+
+            testing.assert_allclose(H[i], lcdm.H_z(zs), rtol=1.e-12)
+            testing.assert_allclose(x[i], lcdm.x_z(zs), rtol=1.e-7)
+            testing.assert_allclose(G[i], lcdm.G_z(zs), rtol=1.e-10)
+            testing.assert_allclose(f[i], lcdm.f_z(zs), rtol=1.e-6)
@@ -0,0 +1,58 @@
+import numpy as np
+from numpy import testing
+
+from quickspec import cov
+
+
+class TestKnox():
+
+    ls = np.arange(10., 200., 10.)
+
+    # positive-definite signal spectra for three tracers
+    rng = np.random.RandomState(1)
+    amat = rng.normal(size=(3, 3))
+    cls = np.einsum('ik,jk,l->ijl', amat, amat, 1. / ls**2)
+    nls = np.outer([1., 2., 3.], 1.e-4 * np.ones_like(ls))
+
+    def test_loops(self):
+        ret = cov.knox(self.ls, self.cls, self.nls, fsky=0.4, dl=10.)
+
+        n = 3
+        ct = self.cls.copy()
+        for i in range(n):
+            ct[i, i] += self.nls[i]
+
+        a, b = cov.pairs(n)
+        for p in range(len(a)):
+            for q in range(len(a)):
+                i, j, k, l = a[p], b[p], a[q], b[q]
+                testing.assert_allclose(
+                    ret[p, q],
+                    (ct[i, k] * ct[j, l] + ct[i, l] * ct[j, k]) /
+                    ((2. * self.ls + 1.) * 0.4 * 10.))
+
+        # auto-spectrum variance 2 (C + N)^2 / ((2l+1) f_sky dl)
+        testing.assert_allclose(
+            ret[0, 0], 2. * ct[0, 0]**2 / ((2. * self.ls + 1.) * 4.))
+
+    def test_packed(self):
+        ret = cov.knox(self.ls, self.cls, self.nls)
+        packed = cov.knox(self.ls, self.cls, self.nls, packed=True)
+
+        assert(packed.shape == (21, len(self.ls)))
+        testing.assert_allclose(cov.unpack(packed), ret)
+
+        # full noise matrix with the same diagonal
+        nls = np.zeros_like(self.cls)
+        nls[np.arange(3), np.arange(3)] = self.nls
+        testing.assert_allclose(cov.knox(self.ls, self.cls, nls), ret)
+
+    def test_block(self):
+        ret = cov.knox(self.ls, self.cls, self.nls)
+        mat = cov.block(ret)
+
+        n_l = len(self.ls)
+        testing.assert_allclose(mat, mat.T)
+        testing.assert_allclose(mat[n_l + 2, 3 * n_l + 2], ret[1, 3, 2])
+        assert(mat[n_l + 2, 3 * n_l + 1] == 0.)
+        assert(np.all(np.linalg.eigvalsh(mat) > 0.))
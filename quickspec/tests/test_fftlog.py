@@ -0,0 +1,33 @@
+import numpy as np
+from numpy import testing
+
+from quickspec import fftlog
+
+
+class TestFFTLog():
+
+    k = np.logspace(-6, 3, 2048)
+
+    def test_j0(self):
+        # \int dk k^2 exp(-k^2/2) sin(kr)/r = sqrt(pi/2) exp(-r^2/2)
+        r, ret = fftlog.fftlog(
+            self.k, self.k**3 * np.exp(-self.k**2 / 2.), fftlog.mellin_jl(0),
+            q=1.)
+        sel = (r > 0.1) & (r < 3.)
+        testing.assert_allclose(
+            ret[sel], np.sqrt(np.pi / 2.) * np.exp(-r[sel]**2 / 2.),
+            rtol=1.e-6)
+
+    def test_J0(self):
+        # \int dk k exp(-k^2/2) J_0(kr) = exp(-r^2/2)
+        r, ret = fftlog.fftlog(
+            self.k, self.k**2 * np.exp(-self.k**2 / 2.),
+            fftlog.mellin_jnu(0), q=1.)
+        sel = (r > 0.1) & (r < 3.)
+        testing.assert_allclose(ret[sel], np.exp(-r[sel]**2 / 2.), rtol=1.e-5)
+
+    def test_leading_dims(self):
+        f = np.array([1., 2.])[:, None] * self.k**3 * np.exp(-self.k**2 / 2.)
+        r, ret = fftlog.fftlog(self.k, f, fftlog.mellin_tophat2, q=1.5)
+        assert ret.shape == (2, len(self.k))
+        testing.assert_allclose(ret[1], 2. * ret[0], rtol=1.e-12)
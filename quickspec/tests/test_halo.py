@@ -0,0 +1,55 @@
+import numpy as np
+from numpy import testing
+
+from quickspec import mps, cosmo
+from quickspec.halo import halo
+
+
+class mass_function():
+    Mmin = 1.e10
+    Mmax = 1.e15
+
+    def dndM_mz(self, m, z):
+        return 1.e-20 * (m / 1.e12)**-2. * np.exp(-m / 1.e14) / (1. + z)
+
+    def b_mz(self, m, z):
+        return 1. + (m / 1.e13)**0.5
+
+
+class halo_profile():
+    def u_km(self, k, m, z):
+        r = 0.1 * (m / 1.e12)**(1. / 3.) / (1. + z)
+        return 1. / (1. + (k * r)**2)
+
+
+class hod():
+    def hod_1h(self, m, z):
+        return m / 1.e12
+
+    def hod_2h(self, m, z):
+        return 1.
+
+
+class TestHaloCache():
+
+    planck15 = cosmo.Planck15()
+    myeihu = mps.lin.eihu(planck15, sigma8=0.8)
+    model = halo.model(mass_function(), halo_profile(), hod(), myeihu)
+    cache = halo.model_cache(model, kmin=1.e-2, kmax=1., npts=5)
+
+    def test_cache(self):
+        k, z = 0.1, 1.
+        testing.assert_allclose(
+            self.cache.p_kz(k, z), self.model.p_kz(k, z), rtol=1.e-3)
+
+    def test_grid(self):
+        k = np.logspace(-2., 0., 20)[[5, 1, 19, 0, 12, 7]]
+        z = np.array([1., 0., 3.5, 0.25])
+
+        grid = self.cache.p_kz_grid(k, z)
+        assert grid.shape == (len(k), len(z))
+        testing.assert_allclose(
+            grid, self.cache.p_kz(k[:, None], z[None, :]), rtol=1.e-10)
+
+        testing.assert_raises(
+            AssertionError, self.cache.p_kz_grid, [2.], z)
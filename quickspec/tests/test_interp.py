@@ -0,0 +1,93 @@
+import numpy as np
+from numpy import testing
+from scipy import interpolate
+
+from quickspec import interp
+
+
+class TestSplines():
+
+    xv = np.linspace(0., 1., 30)
+    yv = np.linspace(-7., 2., 80)
+    f = np.sin(3. * xv)[:, None] * np.cos(yv)[None, :] + xv[:, None]**2
+
+    def test_spline1d(self):
+        x = np.linspace(-0.1, 1.1, 200)
+        for yv in [np.exp(self.xv), np.sin(5. * self.xv)]:
+            testing.assert_allclose(
+                interp.spline1d(self.xv, yv)(x),
+                interpolate.UnivariateSpline(self.xv, yv, k=3, s=0)(x),
+                rtol=1.e-12, atol=1.e-12)
+
+        # The factorized basis is shared between calls
+        assert interp.get_basis(self.xv) is interp.get_basis(self.xv.copy())
+
+    def test_spline2d(self):
+        ref = interpolate.RectBivariateSpline(
+            self.xv, self.yv, self.f, kx=3, ky=3, s=0)
+        spl = interp.spline2d(self.xv, self.yv, self.f)
+
+        x = np.linspace(-0.1, 1.1, 50)
+        y = np.linspace(-8., 3., 70)
+        testing.assert_allclose(spl(x, y), ref(x, y), atol=1.e-12)
+        testing.assert_allclose(
+            spl.ev(x, y[:50]), ref.ev(x, y[:50]), atol=1.e-12)
+        testing.assert_allclose(
+            spl.ev(x[:, None], y[None, :]), ref(x, y), atol=1.e-12)
+        testing.assert_allclose(
+            spl.ev(0.3, -2.), ref.ev(0.3, -2.), rtol=1.e-12)
+
+    def test_ev_grid(self):
+        spl = interp.spline2d(self.xv, self.yv, self.f)
+
+        x = np.array([0.7, 0.1, 0.5, 0.3])
+        y = np.array([-2., 1., -6.5])
+        testing.assert_allclose(
+            interp.ev_grid(spl, x, y),
+            spl.ev(x[:, None], y[None, :]), rtol=1.e-12)
+
+    def test_adjoint(self):
+        basis = interp.get_basis(self.xv)
+        x = np.linspace(0., 1., 17)
+
+        # The adjoint carries functionals of the coefficients over to
+        # functionals of the tabulated values.
+        mat = basis.design(x).toarray()
+        testing.assert_allclose(
+            np.dot(basis.coeffs_adjoint(mat.T).T, np.exp(self.xv)),
+            interp.spline1d(self.xv, np.exp(self.xv))(x), rtol=1.e-12)
+
+
+class TestAdaptive():
+
+    x = np.arange(2., 4001.)
+
+    def test_loglog(self):
+        def f(x):
+            return x**-2. * (2. + np.sin(np.log(x)))
+
+        ret, neval = interp.adaptive_loglog(f, self.x, tol=1.e-6)
+        assert neval < 200
+        testing.assert_allclose(ret, f(self.x), rtol=1.e-5)
+
+    def test_signed(self):
+        def f(x):
+            return np.cos(np.log(x))
+
+        ret, neval = interp.adaptive_loglog(f, self.x, tol=1.e-6)
+        assert neval < 200
+        testing.assert_allclose(ret, f(self.x), atol=1.e-5)
+
+    def test_short(self):
+        def f(x):
+            return x**-2.
+
+        ret, neval = interp.adaptive_loglog(f, [100.])
+        assert neval == 1
+        testing.assert_array_equal(ret, f(np.array([100.])))
+
+        # fewer distinct points than anchors are evaluated directly
+        x = np.array([[103., 100.], [101., 103.]])
+        ret, neval = interp.adaptive_loglog(f, x, n=8)
+        assert neval == 3
+        testing.assert_array_equal(ret, f(x))
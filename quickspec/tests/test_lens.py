@@ -1,7 +1,7 @@
 import numpy as np
 from numpy import testing
 
-from quickspec import lens, cosmo
+from quickspec import lens, cosmo, mps, units
 
 
 class TestLens():
@@ -23,3 +23,22 @@ class TestLens():
         testing.assert_almost_equal(
             kernel_lens.w_lxz(100, 1000, 2),
             1.3105653069227149e-08)
+
+    def test_separable(self):
+        kernel_lens = lens.kern(self.planck15)
+        assert kernel_lens.separable
+
+        ls = np.array([10., 100., 1000.])
+        xx = np.array([100., 1000., 5000.])
+        zz = self.planck15.z_x(xx)
+
+        # W = 3 omm (H0/c)^2 (1+z) (x/l)^2 (1/x - 1/x_lss)
+        reference = (
+            3. * self.planck15.omm * (self.planck15.H0 * 1.e3 / units.c)**2 *
+            (1. + zz) * (xx / ls[:, None])**2 *
+            (1. / xx - 1. / self.planck15.x_z(1100.)))
+        testing.assert_allclose(
+            mps.mps.kernel_lxz(kernel_lens, ls, xx, zz), reference,
+            rtol=1.e-12)
+        testing.assert_allclose(
+            kernel_lens.w_lxz(ls[:, None], xx, zz), reference, rtol=1.e-12)
@@ -1,7 +1,7 @@
 import numpy as np
 from numpy import testing
 
-from quickspec import mps, cosmo
+from quickspec import mps, cosmo, lens, gals, util
 
 
 class TestMpsCamb():
@@ -23,6 +23,13 @@ class TestMpsCamb():
         assert self.mps_initial.n_r == 0.
         assert self.mps_initial.k_pivot == 0.05
 
+    def test_grid(self):
+        kk = np.logspace(-4, 1, 5)[::-1]
+        zz = np.array([3., 0., 10.])
+        testing.assert_allclose(
+            self.mymps.p_kz_grid(kk, zz),
+            self.mymps.p_kz(kk[:, None], zz[None, :]), rtol=1.e-12)
+
     def test_mps_camb(self):
         kk = np.logspace(-4, 1, 5)
         zz = [0, 3, 10]
@@ -39,3 +46,448 @@ class TestMpsCamb():
           4.36329754e+00,   3.21849119e-03]])
 
         testing.assert_allclose(mypkz, reference_pkz, rtol=1.e-3)
+
+
+class TestMpsEihuBatch():
+
+    omb = np.array([0.0486, 0.05])
+    omc = np.array([0.2589, 0.3])
+    oml = 1. - omb - omc
+    H0 = np.array([67.7, 72.])
+    batch = mps.lin.eihu_batch(
+        cosmo.LCDMBatch(omb=omb, omc=omc, oml=oml, H0=H0),
+        sigma8=[0.8, 0.85])
+
+    def test_against_eihu(self):
+        kk = np.logspace(-4, 1, 5)
+        zz = np.array([0., 3., 10.])
+
+        mypkz = self.batch.p_kz(kk, zz)
+        assert mypkz.shape == (2, 5, 3)
+
+        for i, sigma8 in enumerate([0.8, 0.85]):
+            myeihu = mps.lin.eihu(
+                cosmo.LCDM(
+                    omb=self.omb[i], omc=self.omc[i], oml=self.oml[i],
+                    H0=self.H0[i]),
+                sigma8=sigma8)
+            reference_pkz = np.array([myeihu.p_kz(kk, z) for z in zz]).T
+
+            testing.assert_allclose(mypkz[i], reference_pkz, rtol=1.e-10)
+
+
+class TestEihuGrid():
+
+    myeihu = mps.lin.eihu(cosmo.Planck15(), sigma8=0.8)
+
+    def test_grid(self):
+        k = np.logspace(-4., 1., 50)
+        z = np.array([0., 0.5, 2., 10.])
+
+        grid = self.myeihu.p_kz_grid(k, z)
+        testing.assert_allclose(
+            grid, self.myeihu.p_kz(k[:, None], z[None, :]), rtol=1.e-12)
+
+        # the transfer function is reused for the same k grid only
+        transfer = self.myeihu._transfer
+        self.myeihu.p_kz_grid(k, z[:2])
+        assert(self.myeihu._transfer is transfer)
+        testing.assert_allclose(
+            self.myeihu.p_kz_grid(k[::2], 1.)[:, 0],
+            self.myeihu.p_kz(k[::2], 1.), rtol=1.e-12)
+        assert(self.myeihu._transfer is not transfer)
+
+
+class TestSigma():
+
+    planck15 = cosmo.Planck15()
+    myeihu = mps.lin.eihu(planck15, sigma8=0.8)
+
+    def test_sigma8(self):
+        testing.assert_allclose(
+            self.myeihu.sigma_rz(8. / self.planck15.h, 0.), 0.8, rtol=1.e-10)
+
+    def test_against_simps(self):
+        from scipy import integrate
+
+        rr = np.array([[1.], [8.], [20.]])
+        zz = np.array([0., 2.])
+        nk = 2000
+
+        sigma, dsigma2 = self.myeihu.sigma_dsigma2_rz(rr, zz, nk=nk)
+        assert sigma.shape == (3, 2)
+        testing.assert_array_equal(
+            sigma, self.myeihu.sigma_rz(rr, zz, nk=nk))
+        testing.assert_array_equal(
+            dsigma2, self.myeihu.dsigma2_rz(rr, zz, nk=nk))
+
+        dlnk = (np.log(self.myeihu.kmax) - np.log(self.myeihu.kmin)) / nk
+        k = np.exp(np.arange(0, nk) * dlnk + np.log(self.myeihu.kmin))
+        for i, r in enumerate(rr[:, 0]):
+            for j, z in enumerate(zz):
+                kr = k * r
+                wkr = np.sin(kr) - kr * np.cos(kr)
+                pk = self.myeihu.p_kz(k, z)
+                sigma2 = integrate.simps(wkr**2 / kr**3 * pk, dx=dlnk)
+                sigma2 *= 9. / (r**3 * 2. * np.pi**2)
+                ds2 = integrate.simps(
+                    (-9. * wkr / kr**3 + 3. / kr * np.sin(kr)) * wkr * pk,
+                    dx=dlnk)
+                ds2 *= 3. / (r**4 * np.pi**2)
+
+                testing.assert_allclose(sigma[i, j], np.sqrt(sigma2),
+                                        rtol=1.e-12)
+                testing.assert_allclose(dsigma2[i, j], ds2, rtol=1.e-12)
+
+    def test_fftlog(self):
+        for mymps in [self.myeihu, mps.lin.bbks(self.planck15)]:
+            r, sigma, dsigma2 = mymps.sigma_dsigma2_fftlog(0.5)
+            sel = np.where((r > 0.1) & (r < 100.))[0][::20]
+
+            reference = mymps.sigma_dsigma2_rz(r[sel], 0.5, nk=40000)
+            testing.assert_allclose(sigma[sel], reference[0], rtol=1.e-6)
+            testing.assert_allclose(dsigma2[sel], reference[1], rtol=1.e-6)
+
+            r, xi = mymps.xi_fftlog(0.5)
+            assert np.all(xi[r < 50.] > 0.)
+
+
+class TestLimber():
+
+    planck15 = cosmo.Planck15()
+    myeihu = mps.lin.eihu(planck15, sigma8=0.8)
+    mylens = lens.kern(planck15)
+    mygals = gals.kern(
+        planck15, lambda z: np.exp(-(z - 1.)**2 / (2. * 0.3**2)), b=1.)
+    mygals2 = gals.kern(
+        planck15, lambda z: np.exp(-(z - 1.)**2 / (2. * 0.3**2)), b=2.)
+    ls = np.array([20, 200, 2000])
+
+    def test_cross(self):
+        auto = self.myeihu.cl_limber_x(self.mygals, ls=self.ls)
+        cross = self.myeihu.cl_limber_x(self.mygals, self.mygals2, ls=self.ls)
+
+        assert np.all(auto > 0.)
+        testing.assert_allclose(cross, 2. * auto, rtol=1.e-10)
+
+    def test_unchecked(self):
+        with util.unchecked(self.planck15, self.myeihu):
+            assert not self.planck15.check_bounds
+            assert not self.myeihu.check_bounds
+        assert self.planck15.check_bounds
+        assert self.myeihu.check_bounds
+
+        cl = self.myeihu.cl_limber_x(self.mylens, ls=self.ls)
+        assert np.all(cl > 0.)
+        assert self.planck15.check_bounds
+
+        # The range is still checked once per call
+        with testing.assert_raises(AssertionError):
+            self.myeihu.cl_limber_x(self.mylens, ls=self.ls, xmax=1.e5)
+
+    def test_kmax(self):
+        # dn/dz(0) > 0, so l/x at the first node from x = 0 exceeds kmax
+        wide = gals.kern(self.planck15, lambda z: np.exp(-z))
+        myhalofit = mps.halofit(self.myeihu, kmax=10.)
+
+        for method in ['quad', 'grid']:
+            with testing.assert_raises(AssertionError):
+                myhalofit.cl_limber_x(wide, ls=self.ls, method=method)
+            cl = myhalofit.cl_limber_x(
+                wide, ls=self.ls, method=method, xmin=200.)
+            assert np.all(cl > 0.)
+        with testing.assert_raises(AssertionError):
+            myhalofit.cl_limber_z(wide, ls=self.ls)
+        with testing.assert_raises(AssertionError):
+            myhalofit.cl_limber_x_multi([wide], ls=self.ls)
+
+    def test_grid(self):
+        for k1, k2 in [(self.mylens, None), (self.mygals, None),
+                       (self.mylens, self.mygals2)]:
+            cl_quad = self.myeihu.cl_limber_x(k1, k2, ls=self.ls)
+            cl_grid = self.myeihu.cl_limber_x(
+                k1, k2, ls=self.ls, method='grid')
+            testing.assert_allclose(cl_grid, cl_quad, rtol=1.e-5)
+
+    def test_multi(self):
+        kernels = [self.mylens, self.mygals, self.mygals2]
+        cls = self.myeihu.cl_limber_x_multi(kernels, ls=self.ls)
+        assert cls.shape == (3, 3, len(self.ls))
+
+        for i, k1 in enumerate(kernels):
+            for j, k2 in enumerate(kernels):
+                testing.assert_allclose(
+                    cls[i, j],
+                    self.myeihu.cl_limber_x(
+                        k1, k2, ls=self.ls, method='grid'),
+                    rtol=1.e-12)
+
+    def test_operator(self):
+        arr_k = np.logspace(-4., 3., 141)
+        arr_z = np.concatenate([
+            np.linspace(0., 10., 41),
+            np.logspace(np.log10(12.), np.log10(1100.), 30)])
+        mat_p = self.myeihu.p_kz(arr_k[:, None], arr_z[None, :])
+
+        op = mps.mps.limber_operator(
+            self.planck15, arr_k, arr_z, self.mylens, ls=self.ls)
+        testing.assert_allclose(
+            op(mat_p),
+            self.myeihu.cl_limber_x(self.mylens, ls=self.ls, method='grid'),
+            rtol=1.e-4)
+
+        cls = op(np.stack([mat_p, 2. * mat_p], axis=-1))
+        testing.assert_allclose(cls[:, 1], 2. * cls[:, 0], rtol=1.e-12)
+
+    def test_adaptive(self):
+        ls = np.arange(2, 4001)
+        cl, neval = self.myeihu.cl_limber_x_adaptive(
+            self.mylens, ls=ls, tol=1.e-4, method='grid')
+        assert neval < 100
+        testing.assert_allclose(
+            cl, self.myeihu.cl_limber_x(self.mylens, ls=ls, method='grid'),
+            rtol=1.e-4)
+
+        for ls in [np.array([100]), np.arange(100, 104)]:
+            cl, neval = self.myeihu.cl_limber_x_adaptive(
+                self.mylens, ls=ls, method='grid')
+            assert neval == len(ls)
+            testing.assert_array_equal(
+                cl,
+                self.myeihu.cl_limber_x(self.mylens, ls=ls, method='grid'))
+
+    def test_parallel(self):
+        from concurrent import futures
+
+        ls = np.arange(20, 400, 20)
+        cl = self.myeihu.cl_limber_z(self.mygals, self.mylens, ls=ls)
+        clx = self.myeihu.cl_limber_x(
+            self.mygals, self.mylens, ls=ls, support=True)
+        with futures.ThreadPoolExecutor(4) as executor:
+            for i in range(0, 5):
+                testing.assert_array_equal(
+                    self.myeihu.cl_limber_z(
+                        self.mygals, self.mylens, ls=ls, executor=executor,
+                        n_workers=8),
+                    cl)
+                testing.assert_array_equal(
+                    self.myeihu.cl_limber_x(
+                        self.mygals, self.mylens, ls=ls, support=True,
+                        executor=executor, n_workers=8),
+                    clx)
+
+        # The workers leave the shared domain checks alone
+        assert self.planck15.check_bounds
+        assert self.myeihu.check_bounds
+
+        cl = self.myeihu.cl_limber_x(self.mylens, ls=ls)
+        testing.assert_array_equal(
+            self.myeihu.cl_limber_x(self.mylens, ls=ls, n_workers=2), cl)
+
+    def test_support(self):
+        narrow = gals.kern(
+            self.planck15, lambda z: np.exp(-(z - 0.3)**2 / (2. * 0.05**2)))
+        declared = gals.kern(
+            self.planck15, lambda z: np.exp(-(z - 0.3)**2 / (2. * 0.05**2)),
+            zrange=(0., 0.6))
+        far = gals.kern(
+            self.planck15, lambda z: np.exp(-(z - 3.)**2 / (2. * 0.05**2)),
+            zrange=(2.5, 3.5))
+
+        zlo, zhi = self.myeihu.limber_zrange(
+            self.ls, [narrow, self.mylens], 0., 1100.)
+        assert (zlo < 0.01) and (0.5 < zhi < 1.)
+        testing.assert_allclose(
+            self.myeihu.limber_zrange(self.ls, [declared], 0., 1100.),
+            (0., 0.6), atol=1.e-10)
+
+        reference = self.myeihu.cl_limber_x(
+            narrow, ls=self.ls, method='grid', npanels=256)
+        for k in [narrow, declared]:
+            testing.assert_allclose(
+                self.myeihu.cl_limber_x(k, ls=self.ls, support=True),
+                reference, rtol=1.e-4)
+
+        testing.assert_array_equal(
+            self.myeihu.cl_limber_x(declared, far, ls=self.ls, support=True),
+            0.)
+
+        # The range in k is applied per multipole
+        ls = np.array([20., 2000.])
+        for kmax in [1., 5., 10.]:
+            myhalofit = mps.halofit(self.myeihu, kmax=kmax)
+            for cl_limber, kwargs in [
+                    (myhalofit.cl_limber_z, {}),
+                    (myhalofit.cl_limber_x, {'method': 'quad'}),
+                    (myhalofit.cl_limber_x, {'method': 'grid'})]:
+                cl = cl_limber(narrow, ls=ls, support=True, **kwargs)
+                testing.assert_allclose(
+                    cl[0],
+                    cl_limber(narrow, ls=ls[:1], support=True, **kwargs)[0],
+                    rtol=1.e-12)
+            testing.assert_allclose(
+                myhalofit.cl_limber_x_multi([narrow], ls=ls, support=True),
+                cl[None, None, :], rtol=1.e-12)
+
+    def test_nonlimber(self):
+        from scipy import special
+
+        narrow = gals.kern(
+            self.planck15, lambda z: np.exp(-(z - 0.5)**2 / (2. * 0.05**2)))
+        ls = np.array([2, 10, 40, 60])
+        cl = self.myeihu.cl_nonlimber_x(narrow, ls=ls, method='grid')
+
+        # Brute-force spherical Bessel projection at l = 10
+        xs = np.linspace(
+            self.planck15.x_z(0.2), self.planck15.x_z(0.8), 3000)
+        zs = self.planck15.z_x(xs)
+        f = narrow.w_lxz(10, xs, zs) * np.sqrt(
+            self.myeihu.p_kz(1.e-3, zs) / self.myeihu.p_kz(1.e-3, 0.))
+        ks = np.logspace(-4.5, 0.5, 3000)
+        ik = np.array([
+            np.trapz(f * special.spherical_jn(10, k * xs), xs) for k in ks])
+        reference = 2. / np.pi * np.trapz(
+            ks**3 * self.myeihu.p_kz(ks, 0.) * ik**2, np.log(ks))
+        testing.assert_allclose(cl[1], reference, rtol=1.e-6)
+
+        # Limber above lswitch, and close to it just below
+        testing.assert_array_equal(
+            cl[3:], self.myeihu.cl_limber_x(narrow, ls=ls[3:], method='grid'))
+        testing.assert_allclose(
+            cl[2],
+            self.myeihu.cl_limber_x(narrow, ls=ls[2:3], method='grid')[0],
+            rtol=0.05)
+
+
+class TestPd():
+
+    planck15 = cosmo.Planck15()
+    mypd = mps.pd(mps.lin.eihu(planck15, sigma8=0.8))
+
+    def test_against_bisect(self):
+        from scipy import optimize
+
+        k = np.logspace(-3., 1., 9)
+        z = np.array([0., 1., 3.])
+        reference = np.array([[
+            self.mypd.d2_kl(optimize.bisect(
+                lambda kl: self.mypd.knl(kl, tz) - tk,
+                self.mypd.kmin, self.mypd.kmax), tz) *
+            2. * np.pi**2 / tk**3 for tz in z] for tk in k])
+
+        testing.assert_allclose(
+            self.mypd.p_kz(k[:, None], z[None, :]), reference, rtol=1.e-5)
+
+        # the table only ever extends to the largest requested k
+        testing.assert_allclose(
+            self.mypd.p_kz(k[3], z), reference[3], rtol=1.e-5)
+
+    def test_bounds(self):
+        for k in [1.e-6, 1.5e-5, [1.e-6, 1.]]:
+            testing.assert_raises_regex(
+                ValueError, "k out of bounds", self.mypd.p_kz, k, 0.)
+            with util.unchecked(self.mypd):
+                assert np.all(np.isfinite(self.mypd.p_kz(k, 0.)))
+
+    def test_cache(self, tmpdir, monkeypatch):
+        from concurrent import futures
+        from scipy import optimize
+
+        monkeypatch.setenv('QUICKSPEC_DATA', str(tmpdir))
+
+        lin = self.mypd.mps
+        mypd = mps.pd(lin, cache=True)
+        for ik, iz in [(0, 0), (20, 3), (50, 10), (79, 17)]:
+            k, z = mypd.arr_k[ik], mypd.arr_z[iz]
+            testing.assert_allclose(
+                mypd.mat_lnkl[ik, iz], np.log(optimize.bisect(
+                    lambda kl: mypd.knl(kl, z) - k,
+                    0.1 * mypd.kmin, 10. * mypd.kmax)), atol=1.e-6)
+
+        k = np.logspace(-3., 1., 9)
+        testing.assert_allclose(
+            mypd.p_kz(k, 1.), self.mypd.p_kz(k, 1.), rtol=1.e-4)
+
+        with futures.ThreadPoolExecutor(2) as executor:
+            testing.assert_array_equal(
+                mps.pd(lin, cache=True, executor=executor,
+                       n_workers=3).mat_lnkl,
+                mypd.mat_lnkl)
+
+        mps.pd(lin, cache=True, persist=True)
+        assert len(tmpdir.join('cache', 'pd_lnkl').listdir()) == 1
+        stored = mps.pd(lin, cache=True, persist=True)
+        assert isinstance(stored.mat_lnkl, np.memmap)
+        testing.assert_array_equal(stored.mat_lnkl, mypd.mat_lnkl)
+
+
+class TestHalofit():
+
+    planck15 = cosmo.Planck15()
+    myeihu = mps.lin.eihu(planck15, sigma8=0.8)
+    myhalofit = mps.halofit(myeihu)
+
+    def test_nl_scale(self):
+        from scipy import integrate, optimize
+
+        def lnsigma2(lnr, z):
+            return np.log(integrate.quad(
+                lambda lnk: self.myeihu.p_kz(np.exp(lnk), z) *
+                np.exp(3. * lnk - np.exp(2. * (lnk + lnr))) /
+                (2. * np.pi**2), np.log(1.e-5), np.log(1.e3),
+                limit=500, epsabs=0., epsrel=1.e-10)[0])
+
+        z = np.array([0., 1.])
+        ksigma, neff, ncur = self.myhalofit.nl_scale(z)
+        for i, tz in enumerate(z):
+            lnr = optimize.brentq(lnsigma2, -3., 3., args=(tz,), xtol=1.e-12)
+            h = 1.e-3
+            lm, l0, lp = [lnsigma2(lnr + d, tz) for d in [-h, 0., h]]
+
+            testing.assert_allclose(ksigma[i], np.exp(-lnr), rtol=1.e-6)
+            testing.assert_allclose(
+                neff[i], -3. - 0.5 * (lp - lm) / h, rtol=1.e-5)
+            testing.assert_allclose(
+                ncur[i], -(lp - 2. * l0 + lm) / h**2, rtol=1.e-4)
+
+    def test_limits(self):
+        k = np.array([1.e-4, 1., 10.])
+        z = np.array([0., 1., 2000.])
+        ratio = (
+            self.myhalofit.p_kz(k[:, None], z[None, :]) /
+            self.myeihu.p_kz(k[:, None], z[None, :]))
+
+        testing.assert_allclose(ratio[0], 1., rtol=1.e-3)
+        assert(np.all(ratio[1:, :2] > 2.))
+
+        # no non-linear scale at very high redshift
+        assert(self.myhalofit.nl_scale(2000.)[0][0] == np.inf)
+        testing.assert_array_equal(ratio[:, 2], 1.)
+
+
+class TestGrid():
+
+    planck15 = cosmo.Planck15()
+    myeihu = mps.lin.eihu(planck15, sigma8=0.8)
+
+    # unsorted axes
+    k = np.logspace(-3., 1., 20)[[5, 1, 19, 0, 12, 7]]
+    z = np.array([1., 0., 3.5, 0.25])
+
+    def test_grid(self):
+        for p in [
+                mps.lin.bbks(self.planck15),
+                mps.pd(self.myeihu),
+                mps.pd(self.myeihu, cache=True),
+                mps.halofit(self.myeihu)]:
+            grid = p.p_kz_grid(self.k, self.z)
+            assert(grid.shape == (len(self.k), len(self.z)))
+            # spline grids and paired points are summed in different orders
+            testing.assert_allclose(
+                grid, p.p_kz(self.k[:, None], self.z[None, :]),
+                rtol=1.e-10)
+
+        # base class fallback
+        testing.assert_array_equal(
+            mps.mps.mps.p_kz_grid(self.myeihu, self.k, 0.5)[:, 0],
+            self.myeihu.p_kz(self.k, 0.5))
@@ -1,9 +1,13 @@
 from __future__ import print_function
 
+import contextlib
+import hashlib
 import sys
 import time
 import os
 import urllib
+import warnings
+from concurrent import futures
 
 import numpy as np
 
@@ -74,6 +78,201 @@ def deriv(xv, yv=None):
     return ret
 
 
+def cumquad(f, xv, tol=1.e-10, nmin=4, nmax=64):
+    """
+    Cumulative integral of f from xv[0] to every point of the increasing
+    grid xv, using Gauss-Legendre quadrature on each interval of the grid.
+    The number of nodes per interval is doubled, starting from nmin, until
+    the relative change of the cumulative integral drops below tol.
+
+    f is called with a 1D array of nodes and may return an array with
+    additional leading dimensions, which are kept in the output.
+
+    """
+
+    xv = np.asarray(xv, dtype=float)
+    assert(np.all(np.diff(xv) >= 0.))
+
+    lo = xv[:-1]
+    hi = xv[1:]
+
+    def integrate(n):
+        t, w = np.polynomial.legendre.leggauss(n)
+        nodes = 0.5 * (hi - lo)[:, None] * t + 0.5 * (hi + lo)[:, None]
+        fv = np.asarray(f(nodes.flatten()), dtype=float)
+        fv = fv.reshape(fv.shape[:-1] + nodes.shape)
+
+        seg = np.sum(fv * w, axis=-1) * 0.5 * (hi - lo)
+        return np.concatenate(
+            [np.zeros(seg.shape[:-1] + (1,)), np.cumsum(seg, axis=-1)],
+            axis=-1)
+
+    n = nmin
+    ret = integrate(n)
+    while n < nmax:
+        n *= 2
+        new = integrate(n)
+        converged = np.all(np.abs(new - ret) <= tol * np.abs(new))
+        ret = new
+        if converged:
+            return ret
+
+    warnings.warn(
+        'cumquad did not converge to tol=%.1e with %d nodes per interval.' %
+        (tol, nmax))
+    return ret
+
+
+def gauss_legendre(xv, order=8):
+    """
+    Returns the nodes and weights of a composite Gauss-Legendre rule with
+    order nodes on each interval of the increasing grid xv, as flat arrays
+    of length order * (len(xv) - 1).
+
+    """
+
+    xv = np.asarray(xv, dtype=float)
+    assert(np.all(np.diff(xv) > 0.))
+
+    t, w = np.polynomial.legendre.leggauss(order)
+    half = 0.5 * (xv[1:] - xv[:-1])[:, None]
+    mid = 0.5 * (xv[1:] + xv[:-1])[:, None]
+
+    return (half * t + mid).flatten(), (half * w).flatten()
+
+
+def simps_weights(n, dx):
+    """
+    Returns the weights of Simpson's rule for n equally spaced samples
+    with spacing dx, so that np.dot(simps_weights(n, dx), yv) agrees with
+    scipy.integrate.simps(yv, dx=dx). For even n the last interval uses
+    the three-point correction of scipy's default even='simpson'.
+
+    """
+    assert(n >= 3)
+
+    if n % 2 == 1:
+        ret = np.ones(n)
+        ret[1:-1:2] = 4.
+        ret[2:-1:2] = 2.
+        return ret * dx / 3.
+
+    ret = np.zeros(n)
+    ret[:-1] = simps_weights(n - 1, dx)
+    ret[-3:] += np.array([-1., 8., 5.]) * dx / 12.
+    return ret
+
+
+@contextlib.contextmanager
+def unchecked(*objs):
+    """
+    Context manager which switches off the 'check_bounds' domain checks of
+    objs (e.g. a cosmology and a power spectrum) inside the block, and
+    restores the previous settings afterwards. Meant for integrand loops
+    whose range has been validated once beforehand. The flags are shared
+    state, so blocks on the same objects must not run in several threads
+    at once.
+
+    """
+
+    states = [obj.check_bounds for obj in objs]
+    try:
+        for obj in objs:
+            obj.check_bounds = False
+        yield
+    finally:
+        for obj, state in zip(objs, states):
+            obj.check_bounds = state
+
+
+def map_chunks(func, arr, executor=None, n_workers=None, axis=0):
+    """
+    Returns func(c) for contiguous chunks c of arr, evaluated in parallel
+    and concatenated along axis in the original order. There is one chunk
+    per worker, so that func and its bound arguments are pickled once per
+    worker.
+
+    Input
+    -----
+    executor:
+        A concurrent.futures executor. If None, a ProcessPoolExecutor with
+        n_workers processes is created for the call, which requires func
+        to be picklable.
+    n_workers:
+        Number of chunks, by default os.cpu_count().
+
+    """
+
+    if n_workers is None:
+        n_workers = os.cpu_count()
+
+    if executor is None:
+        with futures.ProcessPoolExecutor(n_workers) as executor:
+            return map_chunks(func, arr, executor, n_workers, axis=axis)
+
+    chunks = [c for c in np.array_split(arr, n_workers) if len(c) > 0]
+    return np.concatenate(list(executor.map(func, chunks)), axis=axis)
+
+
+def cache_dir():
+    """
+    Returns the directory of the on-disk cache of tabulated quantities,
+    under $QUICKSPEC_DATA (defaults to the package's data directory).
+
+    """
+
+    return os.path.join(
+        os.environ.get(
+            'QUICKSPEC_DATA', os.path.join(os.path.dirname(__file__), 'data')),
+        'cache')
+
+
+def cache_key(*args):
+    """
+    Returns a hash of args (numbers or arrays), to be used as cache key.
+
+    """
+
+    sha = hashlib.sha1()
+    for arg in args:
+        arg = np.ascontiguousarray(arg)
+        sha.update((str(arg.dtype) + str(arg.shape)).encode())
+        sha.update(arg.tobytes())
+
+    return sha.hexdigest()
+
+
+def cached(name, key, func):
+    """
+    Returns the array func(), stored on disk as cache_dir()/name/key.npy.
+    If that file already exists it is memory-mapped instead of calling func.
+
+    """
+
+    dname = os.path.join(cache_dir(), name)
+    fname = os.path.join(dname, key + '.npy')
+
+    if os.path.exists(fname):
+        return np.load(fname, mmap_mode='r')
+
+    ret = func()
+
+    try:
+        os.makedirs(dname)
+    except OSError:
+        if not os.path.isdir(dname):
+            raise
+
+    # Write to a temporary file first, so that concurrent processes never
+    # load a partially written table.
+    tname = fname + '.%d.tmp' % os.getpid()
+    with open(tname, 'wb') as f:
+        np.save(f, ret)
+    os.rename(tname, fname)
+
+    return ret
+
+
 def download(url, fname):
     """
     Retrieve contents of url, copy to fname.
@@ -100,22 +299,27 @@ def download(url, fname):
         os.remove(fname)
 
 
+def grid(k, z):
+    """
+    Helper function to convert k and z to the 1D axes of a (len(k),
+    len(z)) grid.
+
+    """
+
+    k = np.atleast_1d(np.asarray(k, dtype=float))
+    z = np.atleast_1d(np.asarray(z, dtype=float))
+    assert((k.ndim == 1) and (z.ndim == 1))
+
+    return k, z
+
+
 def pair(k, z):
     """
     Helper function to broadcast k and z to equally sized 1D arrays.
 
     """
 
-    k = np.asarray(k)
-    z = np.asarray(z)
-    if (np.size(k) > 1) and (np.size(z) == 1):
-        z = np.ones(np.size(k)) * z
-        s = np.shape(k)
-    elif (np.size(z) > 1) and (np.size(k) == 1):
-        k = np.ones(np.size(z)) * k
-        s = np.shape(z)
-    else:
-        assert(np.size(k) == np.size(z))
-        s = np.shape(k)
+    k, z = np.broadcast_arrays(np.asarray(k), np.asarray(z))
+    s = np.shape(k)
 
     return k.flatten(), z.flatten(), s